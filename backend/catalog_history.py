@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+def as_utc(at: datetime) -> datetime:
+    return at.replace(tzinfo=timezone.utc) if at.tzinfo is None else at.astimezone(timezone.utc)
+
+def replay(catalog: Dict[str, dict], events: Iterable[dict]) -> Dict[str, dict]:
+    """Apply change events, oldest first, to a catalog keyed by butterfly id"""
+    for event in events:
+        if event["op"] == "delete":
+            catalog.pop(event["butterflyId"], None)
+        else:
+            catalog[event["butterflyId"]] = event["after"]
+    return catalog
+
+def curated(state: dict) -> dict:
+    """A species state with its fixture link dropped, so seeding leaves it alone"""
+    return {k: v for k, v in state.items() if k != "fixtureHash"}
+
+def plan_rollback(
+    current: Dict[str, dict], target: Dict[str, dict]
+) -> Tuple[List[dict], List[Tuple[str, Optional[dict], dict]]]:
+    """Diff stored species against a historical catalog.
+
+    current maps ids to stored documents (with _id), target maps ids to
+    historical states (without). Returns the documents to delete and
+    (id, current document or None, state) triples to write back. Deletes
+    must be applied first: a species re-created under a new id frees its
+    latinName only once the newer copy is gone.
+    """
+    deletes = [doc for bid, doc in current.items() if bid not in target]
+    replaces = []
+    for bid, state in target.items():
+        doc = current.get(bid)
+        if doc is None or {k: v for k, v in doc.items() if k != "_id"} != state:
+            replaces.append((bid, doc, state))
+    return deletes, replaces
+
+def snapshots_to_prune(snapshots: List[dict], now: datetime, keep_latest: int, keep_days: int) -> list:
+    """Ids of snapshots outside the retention policy.
+
+    Keeps the newest keep_latest snapshots, the newest snapshot of each day
+    in the last keep_days, and the oldest one so that any point in history
+    can still be rebuilt by replaying the change log.
+    """
+    ordered = sorted(snapshots, key=lambda s: as_utc(s["timestamp"]), reverse=True)
+    if not ordered:
+        return []
+    keep = {s["_id"] for s in ordered[:keep_latest]}
+    keep.add(ordered[-1]["_id"])
+    horizon = as_utc(now) - timedelta(days=keep_days)
+    days = set()
+    for snapshot in ordered:
+        timestamp = as_utc(snapshot["timestamp"])
+        if timestamp >= horizon and timestamp.date() not in days:
+            days.add(timestamp.date())
+            keep.add(snapshot["_id"])
+    return [s["_id"] for s in ordered if s["_id"] not in keep]
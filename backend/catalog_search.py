@@ -0,0 +1,274 @@
+from typing import Dict, List, Optional, Set, Tuple
+from operator import add, itemgetter
+import bisect
+import heapq
+import re
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Queries up to this length are answered from precomputed per-gram tier buckets
+SHORT_QUERY = 2
+# Above this many trigram candidates, substring matches are verified lazily
+# while ranking and the reported total becomes an upper-bound estimate
+VERIFY_LIMIT = 2000
+
+def normalize_name(name: str) -> str:
+    return " ".join(name.lower().split())
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def short_grams(names) -> Set[str]:
+    """Every one- and two-character substring of the given names"""
+    grams: Set[str] = set()
+    for name in names:
+        grams.update(name)
+        grams.update(map(add, name, name[1:]))
+    return grams
+
+class CatalogSearchIndex:
+    """In-memory typeahead index over commonName and latinName.
+
+    Whole names and individual words live in sorted lists searched with
+    bisect, and trigram postings answer substring queries. Queries of one
+    or two letters match most of a large catalog, so for every such gram the
+    matching ids are kept pre-split into the four ranking tiers, each sorted
+    by rank; a page is then a slice and the total a sum of lengths. All
+    structures are maintained incrementally by the admin CRUD handlers.
+    """
+
+    def __init__(self):
+        self.docs: Dict[str, dict] = {}
+        self.loaded = False
+        self._names: Dict[str, Tuple[str, str]] = {}
+        self._haystack: Dict[str, str] = {}
+        self._word_starts: Dict[str, str] = {}
+        self._order: Dict[str, Tuple[int, str, str]] = {}
+        self._full: List[Tuple[str, str]] = []
+        self._tokens: List[Tuple[str, str]] = []
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._ordered: List[Tuple[str, str]] = []
+        self._short: Dict[str, Tuple[list, list, list, list]] = {}
+        self._ranked: List[Tuple[int, str, str]] = []
+
+    def _words(self, bid: str):
+        common, latin = self._names[bid]
+        return {common, latin}, set(TOKEN_RE.findall(common)) | set(TOKEN_RE.findall(latin))
+
+    def _grams(self, bid: str):
+        common, latin = self._names[bid]
+        return trigrams(common) | trigrams(latin)
+
+    def _short_tiers(self, bid: str) -> Tuple[Set[str], ...]:
+        """Split a document's short grams into exact, name prefix, word prefix and substring"""
+        names, tokens = self._words(bid)
+        grams = short_grams(names)
+        exact = grams & names
+        name_prefix = {name[:n] for name in names for n in (1, 2)} & grams
+        name_prefix -= exact
+        word_prefix = {token[:n] for token in tokens for n in (1, 2)}
+        word_prefix -= exact | name_prefix
+        return exact, name_prefix, word_prefix, grams - exact - name_prefix - word_prefix
+
+    def _add_short(self, bid: str, insert):
+        key = self._order[bid]
+        short = self._short
+        for tier, grams in enumerate(self._short_tiers(bid)):
+            for gram in grams:
+                buckets = short.get(gram)
+                if buckets is None:
+                    buckets = short[gram] = ([], [], [], [])
+                insert(buckets[tier], key)
+
+    def _index(self, butterfly: dict) -> str:
+        bid = str(butterfly["_id"])
+        self.docs[bid] = butterfly
+        common = normalize_name(butterfly.get("commonName", ""))
+        latin = normalize_name(butterfly.get("latinName", ""))
+        self._names[bid] = (common, latin)
+        self._haystack[bid] = f"{common}\n{latin}"
+        # " word word ...": a word starts with t exactly when " " + t occurs
+        self._word_starts[bid] = " " + " ".join(self._words(bid)[1])
+        self._order[bid] = (len(common), common, bid)
+        for gram in self._grams(bid):
+            self._trigrams.setdefault(gram, set()).add(bid)
+        return bid
+
+    def load(self, butterflies: List[dict]):
+        """Rebuild the index from scratch, sorting each list once"""
+        self.__init__()
+        for b in butterflies:
+            bid = self._index(b)
+            names, tokens = self._words(bid)
+            self._full.extend((name, bid) for name in names)
+            self._tokens.extend((token, bid) for token in tokens)
+            self._ordered.append((self._names[bid][0], bid))
+        # Visiting documents in rank order leaves every bucket sorted
+        self._ranked = sorted(self._order.values())
+        for key in self._ranked:
+            self._add_short(key[2], list.append)
+        self._full.sort()
+        self._tokens.sort()
+        self._ordered.sort()
+        self.loaded = True
+
+    def upsert(self, butterfly: dict):
+        bid = str(butterfly["_id"])
+        if bid in self.docs:
+            self.remove(bid)
+        self._index(butterfly)
+        names, tokens = self._words(bid)
+        for name in names:
+            bisect.insort(self._full, (name, bid))
+        for token in tokens:
+            bisect.insort(self._tokens, (token, bid))
+        bisect.insort(self._ordered, (self._names[bid][0], bid))
+        self._add_short(bid, bisect.insort)
+        bisect.insort(self._ranked, self._order[bid])
+
+    def remove(self, butterfly_id: str):
+        if butterfly_id not in self.docs:
+            return
+        names, tokens = self._words(butterfly_id)
+        for entries, keys in ((self._full, names), (self._tokens, tokens)):
+            for key in keys:
+                del entries[bisect.bisect_left(entries, (key, butterfly_id))]
+        for gram in self._grams(butterfly_id):
+            postings = self._trigrams[gram]
+            postings.discard(butterfly_id)
+            if not postings:
+                del self._trigrams[gram]
+        del self._ordered[bisect.bisect_left(self._ordered, (self._names[butterfly_id][0], butterfly_id))]
+        key = self._order[butterfly_id]
+        del self._ranked[bisect.bisect_left(self._ranked, key)]
+        for tier, grams in enumerate(self._short_tiers(butterfly_id)):
+            for gram in grams:
+                buckets = self._short[gram]
+                del buckets[tier][bisect.bisect_left(buckets[tier], key)]
+                if not any(buckets):
+                    del self._short[gram]
+        del self.docs[butterfly_id]
+        del self._names[butterfly_id]
+        del self._haystack[butterfly_id]
+        del self._word_starts[butterfly_id]
+        del self._order[butterfly_id]
+
+    def _bounds(self, entries: List[Tuple[str, str]], prefix: str, exact: bool = False) -> Tuple[int, int]:
+        lo = bisect.bisect_left(entries, (prefix,))
+        return lo, bisect.bisect_left(entries, (prefix + ("\0" if exact else "\uffff"),), lo)
+
+    def _range(self, entries: List[Tuple[str, str]], prefix: str, exact: bool = False) -> Set[str]:
+        lo, hi = self._bounds(entries, prefix, exact)
+        return set(map(itemgetter(1), entries[lo:hi]))
+
+    def _word_prefix_ids(self, query: str) -> Set[str]:
+        """Ids where every query word prefixes some word of a name.
+
+        Starts from the most selective word; a word matching several times
+        more ids than remain (typically the one or two letters just typed) is
+        checked per candidate instead of being materialised.
+        """
+        bounds = [(self._bounds(self._tokens, token), token) for token in set(TOKEN_RE.findall(query))]
+        bounds.sort(key=lambda item: item[0][1] - item[0][0])
+        ids: Optional[Set[str]] = None
+        for (lo, hi), token in bounds:
+            if ids is None:
+                ids = set(map(itemgetter(1), self._tokens[lo:hi]))
+            elif hi - lo <= 3 * len(ids):
+                ids.intersection_update(map(itemgetter(1), self._tokens[lo:hi]))
+            else:
+                needle, word_starts = " " + token, self._word_starts
+                ids = {bid for bid in ids if needle in word_starts[bid]}
+            if not ids:
+                break
+        return ids or set()
+
+    def _contains(self, query: str):
+        haystack = self._haystack
+        return lambda bid: query in haystack[bid]
+
+    def _substring_ids(self, query: str, seen: Set[str]) -> Tuple[Set[str], bool]:
+        """Ids containing query as a substring, leaving out those already in seen.
+
+        Returns the ids and whether they were verified; large candidate sets
+        are returned as trigram matches only.
+        """
+        postings = [self._trigrams.get(gram) for gram in trigrams(query)]
+        if not postings or any(p is None for p in postings):
+            return set(), True
+        postings.sort(key=len)
+        ids = postings[0].difference(seen)
+        if len(postings) == 1:
+            # A three-letter query is its own trigram; the postings are exact
+            return ids, True
+        ids.intersection_update(*postings[1:])
+        if len(ids) > VERIFY_LIMIT:
+            return ids, False
+        return set(filter(self._contains(query), ids)), True
+
+    def _best(self, tier: Set[str], count: int, accept=None) -> List[str]:
+        """The count best-ranked ids of a tier, optionally filtered by accept"""
+        if count <= 0 or not tier:
+            return []
+        if len(tier) ** 2 <= count * len(self._ranked):
+            candidates = tier if accept is None else filter(accept, tier)
+            return heapq.nsmallest(count, candidates, key=self._order.__getitem__)
+        # A large tier is dense in the global ranking, so a short walk finds its head
+        best = []
+        for key in self._ranked:
+            bid = key[2]
+            if bid in tier and (accept is None or accept(bid)):
+                best.append(bid)
+                if len(best) == count:
+                    break
+        return best
+
+    def search(self, query: str, offset: int = 0, limit: int = 20) -> Tuple[int, List[dict], bool]:
+        """Return the match count, one ranked page of documents and whether the count is exact.
+
+        The count is an upper bound when a substring query has more than
+        VERIFY_LIMIT trigram candidates.
+
+        Matches are ranked exact name, then name prefix, then word prefix,
+        then substring; ties are broken by shorter, then alphabetical, name.
+        """
+        query = normalize_name(query)
+        if not query:
+            page = self._ordered[offset:offset + limit]
+            return len(self._ordered), [self.docs[bid] for _, bid in page], True
+        if len(query) <= SHORT_QUERY:
+            return self._search_short(query, offset, limit)
+
+        name_prefix = self._range(self._full, query)
+        exact = self._range(self._full, query, exact=True)
+        word_prefix = self._word_prefix_ids(query)
+
+        tiers = [exact, name_prefix - exact]
+        seen = name_prefix
+        tiers.append(word_prefix - seen)
+        seen |= word_prefix
+        substring, verified = self._substring_ids(query, seen)
+        tiers.append(substring)
+
+        wanted = offset + limit
+        ranked: List[str] = []
+        for i, tier in enumerate(tiers):
+            if len(ranked) >= wanted:
+                break
+            accept = None if verified or i < 3 else self._contains(query)
+            ranked.extend(self._best(tier, wanted - len(ranked), accept))
+        total = len(seen) + len(substring)
+        return total, [self.docs[bid] for bid in ranked[offset:wanted]], verified
+
+    def _search_short(self, query: str, offset: int, limit: int) -> Tuple[int, List[dict], bool]:
+        """Page through the pre-ranked tier buckets of a one- or two-letter query"""
+        buckets = self._short.get(query, ())
+        page: List[dict] = []
+        for bucket in buckets:
+            if len(page) >= limit:
+                break
+            if offset >= len(bucket):
+                offset -= len(bucket)
+                continue
+            page.extend(self.docs[key[2]] for key in bucket[offset:offset + limit - len(page)])
+            offset = 0
+        return sum(map(len, buckets)), page, True
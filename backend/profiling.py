@@ -0,0 +1,223 @@
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+import asyncio
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+PROFILE_NAME_RE = re.compile(r"^[\w.-]+\.collapsed$")
+FRAME_RE = re.compile(r"^(?P<name>.*) \((?P<file>.*):(?P<line>\d+)\)$")
+
+class StackSampler:
+    """Samples every thread's Python stack on a background thread.
+
+    Stacks are accumulated in collapsed form ("thread;outer;inner" -> count),
+    which is what flame graph tools and the speedscope export are built from.
+    The thread name comes first so Motor's executor threads can be told apart
+    from the event loop, which shows up as idle while it waits on them.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(f"thread {names.get(thread_id, thread_id)}")
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+class Profiler:
+    """Opt-in request/window profiling writing to a bounded on-disk ring.
+
+    Holds this worker's copy of the profiling settings; the server keeps the
+    shared settings in the database and applies them here with configure()
+    and start_window(). Profiles are written to this worker's profiles_dir.
+    """
+
+    def __init__(self, profiles_dir: Path, ring_size: int = 20, interval: float = 0.005):
+        self.profiles_dir = profiles_dir
+        self.ring_size = ring_size
+        self.interval = interval
+        self.sample_rate = 0.0
+        self.path_prefix = "/api/"
+        self.capturing = False
+        self.window_id: Optional[str] = None
+        self.window_task: Optional[asyncio.Task] = None
+
+    @property
+    def active(self):
+        return self.sample_rate > 0
+
+    def configure(self, sample_rate: float, path_prefix: str = "/api/"):
+        self.sample_rate = sample_rate
+        self.path_prefix = path_prefix
+
+    def start_window(self, window_id: str, seconds: float) -> bool:
+        """Start the capture window with this id unless it already ran here.
+
+        Returns False when a request capture is in progress; the caller
+        retries on its next poll.
+        """
+        if window_id == self.window_id:
+            return True
+        if self.capturing:
+            return False
+        self.window_id = window_id
+        self.window_task = asyncio.create_task(self._capture_window(seconds))
+        return True
+
+    def stop_window(self):
+        if self.window_task is not None:
+            self.window_task.cancel()
+            self.window_task = None
+
+    def disable(self):
+        self.sample_rate = 0.0
+        self.stop_window()
+
+    def should_sample(self, path: str) -> bool:
+        if self.capturing or not path.startswith(self.path_prefix):
+            return False
+        return random.random() < self.sample_rate
+
+    def begin(self) -> StackSampler:
+        self.capturing = True
+        return StackSampler(self.interval).start()
+
+    async def end(self, sampler: StackSampler, label: str):
+        stacks = sampler.stop()
+        self.capturing = False
+        if stacks:
+            await asyncio.to_thread(self._write, stacks, label)
+
+    async def _capture_window(self, seconds: float):
+        sampler = self.begin()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await self.end(sampler, f"window pid{os.getpid()}")
+            self.window_task = None
+
+    def _write(self, stacks: Counter, label: str):
+        self.profiles_dir.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^\w.-]+", "_", label).strip("_")
+        name = f"{time.time_ns()}-{slug}.collapsed"
+        (self.profiles_dir / name).write_text(
+            "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        )
+        # Keep only the newest ring_size profiles
+        for old in self.list()[self.ring_size:]:
+            (self.profiles_dir / old["name"]).unlink(missing_ok=True)
+
+    def list(self) -> List[dict]:
+        """Stored profiles, newest first"""
+        if not self.profiles_dir.exists():
+            return []
+        profiles = [
+            {"name": p.name, "size": p.stat().st_size, "createdAt": p.stat().st_mtime}
+            for p in self.profiles_dir.glob("*.collapsed")
+        ]
+        return sorted(profiles, key=lambda p: p["name"], reverse=True)
+
+    def read(self, name: str) -> str:
+        """Contents of a stored profile; only plain profile file names are accepted"""
+        path = self.profiles_dir / name
+        if not PROFILE_NAME_RE.match(name) or not path.is_file():
+            raise FileNotFoundError(name)
+        return path.read_text()
+
+def collapsed_to_speedscope(name: str, collapsed: str) -> dict:
+    """Convert collapsed stacks into a speedscope "sampled" profile"""
+    frames: List[dict] = []
+    frame_index: Dict[str, int] = {}
+    samples: List[List[int]] = []
+    weights: List[int] = []
+    for line in collapsed.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if not stack:
+            continue
+        indices = []
+        for entry in stack.split(";"):
+            if entry not in frame_index:
+                match = FRAME_RE.match(entry)
+                frame_index[entry] = len(frames)
+                frames.append(
+                    {"name": match["name"], "file": match["file"], "line": int(match["line"])}
+                    if match else {"name": entry}
+                )
+            indices.append(frame_index[entry])
+        samples.append(indices)
+        weights.append(int(count))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "butterfly-api",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "none",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+class ProfilingMiddleware:
+    """Capture a stack profile for sampled requests or an admin X-Profile header.
+
+    Written as plain ASGI so the disabled path is a couple of attribute checks.
+    """
+
+    def __init__(self, app, profiler: Profiler, admin_token: Optional[str] = None):
+        self.app = app
+        self.profiler = profiler
+        self.admin_token = admin_token.encode() if admin_token else None
+
+    def _forced(self, scope) -> bool:
+        headers = scope["headers"]
+        if not any(name == b"x-profile" for name, _ in headers):
+            return False
+        token = next((value for name, value in headers if name == b"x-admin-token"), b"")
+        return hmac.compare_digest(token, self.admin_token)
+
+    async def __call__(self, scope, receive, send):
+        profiler = self.profiler
+        if scope["type"] != "http" or profiler.capturing or not (
+            (profiler.active and profiler.should_sample(scope["path"]))
+            or (self.admin_token and self._forced(scope))
+        ):
+            return await self.app(scope, receive, send)
+        sampler = profiler.begin()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # Other requests on the same event loop land in this capture too
+            await profiler.end(sampler, f"{scope['method']} {scope['path']} interleaved")
@@ -0,0 +1,307 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+import random
+import statistics
+
+# Weight boost applied per recorded miss of a species
+MISS_BOOST = 2.0
+# Maximum number of per-session histories kept in memory (LRU)
+MAX_SESSIONS = 1000
+# Rejection draws against the global tree before falling back to a linear scan
+MAX_REJECTIONS = 16
+
+class FenwickSampler:
+    """Weighted sampler over butterfly ids backed by a Fenwick (binary indexed) tree.
+
+    Weight updates, appends and draws are all O(log n). Removed ids leave a
+    zero-weight slot behind which is compacted once free slots dominate.
+    """
+
+    def __init__(self):
+        self._ids: List[Optional[str]] = []
+        self._index: Dict[str, int] = {}
+        self._weights: List[float] = []
+        self._tree: List[float] = [0.0]
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, butterfly_id):
+        return butterfly_id in self._index
+
+    def _prefix(self, i):
+        total = 0.0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _add(self, i, delta):
+        i += 1
+        n = len(self._weights)
+        while i <= n:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _rebuild(self):
+        live = [(bid, self._weights[i]) for bid, i in self._index.items()]
+        self._ids = [bid for bid, _ in live]
+        self._weights = [w for _, w in live]
+        self._index = {bid: i for i, bid in enumerate(self._ids)}
+        n = len(self._weights)
+        self._tree = [0.0] * (n + 1)
+        for i, w in enumerate(self._weights, start=1):
+            self._tree[i] += w
+            parent = i + (i & -i)
+            if parent <= n:
+                self._tree[parent] += self._tree[i]
+
+    def total(self):
+        return self._prefix(len(self._weights))
+
+    def weight(self, butterfly_id):
+        return self._weights[self._index[butterfly_id]]
+
+    def set_weight(self, butterfly_id, weight):
+        """Set the weight of an id, appending it if it is new"""
+        i = self._index.get(butterfly_id)
+        if i is not None:
+            self._add(i, weight - self._weights[i])
+            self._weights[i] = weight
+            return
+        # Append: the new node covers (j - lowbit(j), j], so its value is the
+        # new weight plus the sum of the earlier entries in that range.
+        j = len(self._weights) + 1
+        self._index[butterfly_id] = j - 1
+        self._ids.append(butterfly_id)
+        self._weights.append(weight)
+        self._tree.append(weight + self._prefix(j - 1) - self._prefix(j - (j & -j)))
+
+    def remove(self, butterfly_id):
+        i = self._index.pop(butterfly_id, None)
+        if i is None:
+            return
+        self._add(i, -self._weights[i])
+        self._weights[i] = 0.0
+        self._ids[i] = None
+        if len(self._weights) > 2 * len(self._index) + 16:
+            self._rebuild()
+
+    def _descend(self, rng):
+        n = len(self._weights)
+        target = rng.random() * self.total()
+        pos = 0
+        step = 1 << (n.bit_length() - 1)
+        while step:
+            nxt = pos + step
+            if nxt <= n and self._tree[nxt] <= target:
+                pos = nxt
+                target -= self._tree[nxt]
+            step >>= 1
+        # Guard against float drift landing past the last positive weight
+        if pos >= n or self._weights[pos] <= 0:
+            pos = max(i for i, w in enumerate(self._weights) if w > 0)
+        return self._ids[pos]
+
+    def sample(self, rng=random, exclude: Iterable[str] = ()):
+        """Draw one id with probability proportional to its weight, skipping excluded ids.
+
+        Excluded ids are handled by rejection; if they hold most of the mass
+        the draw falls back to a linear scan over the remaining ids.
+        """
+        if not self._index or self.total() <= 0:
+            return None
+        exclude = exclude if isinstance(exclude, (set, frozenset, dict)) else set(exclude)
+        for _ in range(MAX_REJECTIONS):
+            bid = self._descend(rng)
+            if bid not in exclude:
+                return bid
+        remaining = [(bid, self._weights[i]) for bid, i in self._index.items()
+                     if bid not in exclude and self._weights[i] > 0]
+        return weighted_choice(remaining, rng)
+
+    def sample_distinct(self, k, rng=random, exclude: Iterable[str] = ()):
+        """Draw up to k distinct ids without replacement"""
+        taken = set(exclude)
+        drawn = []
+        for _ in range(k):
+            bid = self.sample(rng, taken)
+            if bid is None:
+                break
+            drawn.append(bid)
+            taken.add(bid)
+        return drawn
+
+def weighted_choice(items: List[tuple], rng=random):
+    """Pick a key from (key, weight) pairs proportionally to weight"""
+    total = sum(w for _, w in items)
+    if total <= 0:
+        return None
+    target = rng.random() * total
+    for key, w in items:
+        target -= w
+        if target < 0:
+            return key
+    return items[-1][0]
+
+def species_weight(shown: int, missed: int) -> float:
+    """Sampling weight favouring species that were rarely shown or often missed"""
+    return (1.0 + MISS_BOOST * missed) / (1.0 + shown)
+
+class QuizSampler:
+    """Global exposure-weighted sampler with per-session overrides.
+
+    Sessions only keep sparse counts for the species they have seen. A
+    session's weight for such a species is the live global weight scaled by
+    species_weight() of the session's own counts; every other species is
+    drawn straight from the global tree.
+
+    Global counts are shared between workers through the database: local
+    increments pile up in ``pending`` until take_pending() flushes them, and
+    apply_totals() folds the shared totals back in. A species new to the
+    history starts at the median counts of the others, so it does not take
+    over the quiz after a long uptime.
+    """
+
+    def __init__(self):
+        self.catalog: Dict[str, dict] = {}
+        self.loaded = False
+        self.sampler = FenwickSampler()
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self.pending: Dict[str, Dict[str, float]] = {}
+        self.baselines: Dict[str, Dict[str, float]] = {}
+        self.sessions: "OrderedDict[str, Dict[str, Dict[str, int]]]" = OrderedDict()
+
+    def _new_stats(self):
+        return {"shown": 0, "missed": 0}
+
+    def _baseline(self) -> Dict[str, float]:
+        if not self.stats:
+            return self._new_stats()
+        return {
+            field: statistics.median(s[field] for s in self.stats.values())
+            for field in ("shown", "missed")
+        }
+
+    def _add_species(self, bid: str, baseline: Dict[str, float]):
+        self.stats[bid] = dict(baseline)
+        self.baselines[bid] = dict(baseline)
+        self.sampler.set_weight(bid, species_weight(baseline["shown"], baseline["missed"]))
+
+    def load(self, butterflies: List[dict]):
+        """Replace the cached catalog, keeping exposure history for known ids"""
+        self.catalog = {str(b["_id"]): b for b in butterflies}
+        self.sampler = FenwickSampler()
+        known = {bid: self.stats[bid] for bid in self.catalog if bid in self.stats}
+        self.stats = known
+        baseline = self._baseline()
+        for bid in self.catalog:
+            if bid in known:
+                self.sampler.set_weight(bid, species_weight(known[bid]["shown"], known[bid]["missed"]))
+            else:
+                self._add_species(bid, baseline)
+        for local in self.sessions.values():
+            for bid in [bid for bid in local if bid not in self.catalog]:
+                del local[bid]
+        self.loaded = True
+
+    def upsert(self, butterfly: dict):
+        bid = str(butterfly["_id"])
+        self.catalog[bid] = butterfly
+        if bid not in self.stats:
+            self._add_species(bid, self._baseline())
+
+    def remove(self, butterfly_id: str):
+        self.catalog.pop(butterfly_id, None)
+        self.stats.pop(butterfly_id, None)
+        self.pending.pop(butterfly_id, None)
+        self.baselines.pop(butterfly_id, None)
+        self.sampler.remove(butterfly_id)
+        for local in self.sessions.values():
+            local.pop(butterfly_id, None)
+
+    def _session(self, session_id: str) -> Dict[str, Dict[str, int]]:
+        local = self.sessions.get(session_id)
+        if local is None:
+            local = self.sessions[session_id] = {}
+            if len(self.sessions) > MAX_SESSIONS:
+                self.sessions.popitem(last=False)
+        else:
+            self.sessions.move_to_end(session_id)
+        return local
+
+    def session_weight(self, butterfly_id: str, session_id: str) -> float:
+        """Effective weight of a species for one session"""
+        weight = self.sampler.weight(butterfly_id)
+        local = self.sessions.get(session_id, {}).get(butterfly_id)
+        if local is None:
+            return weight
+        return weight * species_weight(local["shown"], local["missed"])
+
+    def _record(self, butterfly_id: str, session_id: Optional[str], field: str):
+        if butterfly_id not in self.stats:
+            return
+        stats = self.stats[butterfly_id]
+        stats[field] += 1
+        self.pending.setdefault(butterfly_id, self._new_stats())[field] += 1
+        self.sampler.set_weight(butterfly_id, species_weight(stats["shown"], stats["missed"]))
+        if session_id:
+            local = self._session(session_id).setdefault(butterfly_id, self._new_stats())
+            local[field] += 1
+
+    def record_shown(self, butterfly_id: str, session_id: Optional[str] = None):
+        self._record(butterfly_id, session_id, "shown")
+
+    def record_missed(self, butterfly_id: str, session_id: Optional[str] = None):
+        self._record(butterfly_id, session_id, "missed")
+
+    def take_pending(self) -> Tuple[Dict[str, Dict[str, float]], Dict[str, Dict[str, float]]]:
+        """Hand over unflushed increments and new-species baselines"""
+        pending, baselines = self.pending, self.baselines
+        self.pending, self.baselines = {}, {}
+        return pending, baselines
+
+    def restore_pending(self, pending: Dict[str, Dict[str, float]], baselines: Dict[str, Dict[str, float]]):
+        """Put back increments from a flush that failed"""
+        for bid, delta in pending.items():
+            if bid in self.stats:
+                local = self.pending.setdefault(bid, self._new_stats())
+                for field, value in delta.items():
+                    local[field] += value
+        for bid, baseline in baselines.items():
+            if bid in self.stats:
+                self.baselines.setdefault(bid, baseline)
+
+    def apply_totals(self, totals: Dict[str, Dict[str, float]]):
+        """Adopt shared totals, keeping increments recorded since the last flush"""
+        for bid, total in totals.items():
+            if bid not in self.stats:
+                continue
+            delta = self.pending.get(bid, {})
+            merged = {field: total.get(field, 0) + delta.get(field, 0) for field in ("shown", "missed")}
+            if merged != self.stats[bid]:
+                self.stats[bid] = merged
+                self.sampler.set_weight(bid, species_weight(merged["shown"], merged["missed"]))
+
+    def _pick(self, session_id: Optional[str], taken: set, rng):
+        local = self._session(session_id) if session_id else {}
+        touched = [(bid, self.session_weight(bid, session_id)) for bid in local if bid not in taken]
+        touched_mass = sum(w for _, w in touched)
+        # Mass of the untouched species, taken straight from the global tree
+        global_mass = self.sampler.total() - sum(self.sampler.weight(bid) for bid in local)
+        global_mass -= sum(self.sampler.weight(bid) for bid in taken if bid not in local)
+        if touched and rng.random() * (touched_mass + max(global_mass, 0.0)) < touched_mass:
+            return weighted_choice(touched, rng)
+        return self.sampler.sample(rng, taken.union(local)) or weighted_choice(touched, rng)
+
+    def draw(self, session_id: Optional[str] = None, num_options: int = 5, rng=random):
+        """Pick a correct answer and distinct distractors"""
+        taken: set = set()
+        picks = []
+        for _ in range(min(num_options, len(self.sampler))):
+            bid = self._pick(session_id, taken, rng)
+            if bid is None:
+                break
+            picks.append(bid)
+            taken.add(bid)
+        return picks[0], picks[1:]
@@ -0,0 +1,52 @@
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import hashlib
+import json
+
+def load_fixtures(fixtures_dir: Path) -> Tuple[str, List[dict]]:
+    """Read the versioned fixture files in order and return (checksum, records).
+
+    Files are applied in filename order, so later versions override earlier
+    ones for the same latinName.
+    """
+    digest = hashlib.sha256()
+    records: Dict[str, dict] = {}
+    for path in sorted(fixtures_dir.glob('*.json')):
+        raw = path.read_bytes()
+        digest.update(path.name.encode())
+        digest.update(raw)
+        for record in json.loads(raw):
+            records[record["latinName"]] = record
+    return digest.hexdigest(), list(records.values())
+
+def fixture_hash(record: dict) -> str:
+    return hashlib.sha256(json.dumps(record, sort_keys=True).encode()).hexdigest()
+
+def fixtures_current(state: Optional[dict], checksum: str, force: bool = False) -> bool:
+    """Whether the fixtures recorded in seed_state match the files on disk"""
+    return not force and bool(state) and state.get("checksum") == checksum
+
+def plan_seed(
+    batch: Iterable[dict],
+    existing: Dict[str, dict],
+    deleted_names: set,
+    new_id: Callable[[], object],
+) -> Tuple[List[dict], List[Tuple[dict, dict]]]:
+    """Decide which fixture records to insert and which seeded species to update.
+
+    existing maps latinName to the stored species. Returns the documents to
+    insert and (current, doc) pairs to update. Species an admin deleted are
+    not re-inserted, and species without a fixtureHash (created or edited by
+    an admin) are never touched.
+    """
+    inserts: List[dict] = []
+    updates: List[Tuple[dict, dict]] = []
+    for record in batch:
+        doc = {**record, "fixtureHash": fixture_hash(record)}
+        current = existing.get(record["latinName"])
+        if current is None:
+            if record["latinName"] not in deleted_names:
+                inserts.append({**doc, "_id": new_id()})
+        elif current.get("fixtureHash") not in (None, doc["fixtureHash"]):
+            updates.append((current, doc))
+    return inserts, updates
@@ -1,14 +1,27 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Header, Depends
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import time
+import asyncio
+import hmac
+import secrets
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional, Set
 import random
 from bson import ObjectId
+from quiz_sampling import QuizSampler
+from catalog_search import CatalogSearchIndex
+from seeding import fixtures_current, load_fixtures, plan_seed
+from profiling import Profiler, ProfilingMiddleware, collapsed_to_speedscope
+from catalog_history import as_utc, curated, plan_rollback, replay, snapshots_to_prune
+from pymongo import UpdateOne, ReplaceOne, DeleteOne, ReturnDocument
+from pymongo.errors import BulkWriteError, OperationFailure, DuplicateKeyError
+from datetime import datetime, timedelta, timezone
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -18,6 +31,38 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Seeding configuration
+FIXTURES_DIR = ROOT_DIR / 'fixtures' / 'butterflies'
+SEED_BATCH_SIZE = int(os.environ.get('SEED_BATCH_SIZE', '500'))
+SEED_LOCK_SECONDS = int(os.environ.get('SEED_LOCK_SECONDS', '120'))
+SEED_ON_STARTUP = os.environ.get('SEED_ON_STARTUP', 'false').lower() in ('1', 'true', 'yes')
+
+# How long a worker trusts its in-memory catalog before re-checking the shared version
+CATALOG_TTL = float(os.environ.get('CATALOG_TTL_SECONDS', '2'))
+
+# Quiz exposure counts are flushed to and re-read from Mongo this often
+EXPOSURE_SYNC_SECONDS = float(os.environ.get('EXPOSURE_SYNC_SECONDS', '10'))
+# Unanswered quiz questions expire after this long
+QUESTION_TTL_SECONDS = int(os.environ.get('QUESTION_TTL_SECONDS', '3600'))
+
+# Profiling configuration; profiling endpoints are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+PROFILES_DIR = Path(os.environ.get('PROFILES_DIR', ROOT_DIR / 'profiles'))
+PROFILE_RING_SIZE = int(os.environ.get('PROFILE_RING_SIZE', '20'))
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL_MS', '5')) / 1000
+# Workers pick up profiling settings changed through another worker this often
+PROFILE_POLL_SECONDS = float(os.environ.get('PROFILE_POLL_SECONDS', '2'))
+
+# Audit log configuration
+SNAPSHOT_EVERY = int(os.environ.get('SNAPSHOT_EVERY', '500'))
+SNAPSHOT_CHUNK_SIZE = int(os.environ.get('SNAPSHOT_CHUNK_SIZE', '5000'))
+# Snapshots only fold changes older than this, well past MongoDB's 60s
+# transaction limit, so no event can still commit behind a snapshot
+SNAPSHOT_LAG_SECONDS = int(os.environ.get('SNAPSHOT_LAG_SECONDS', '120'))
+# Retention: the newest SNAPSHOT_KEEP snapshots plus one per day for SNAPSHOT_KEEP_DAYS
+SNAPSHOT_KEEP = int(os.environ.get('SNAPSHOT_KEEP', '10'))
+SNAPSHOT_KEEP_DAYS = int(os.environ.get('SNAPSHOT_KEEP_DAYS', '30'))
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -44,6 +89,421 @@ class GameSession(BaseModel):
     total: int
     timestamp: str
 
+class ButterflySearchResults(BaseModel):
+    results: List[Butterfly]
+    total: int
+    # False when total is an upper-bound estimate for a very broad query
+    totalExact: bool = True
+    page: int
+    limit: int
+
+class ProfilingConfig(BaseModel):
+    sampleRate: float = Field(0.0, ge=0.0, le=1.0)
+    windowSeconds: Optional[float] = Field(None, gt=0, le=600)
+    pathPrefix: str = "/api/"
+
+class ProfileInfo(BaseModel):
+    name: str
+    size: int
+    createdAt: float
+
+class ChangeEvent(BaseModel):
+    id: str
+    butterflyId: str
+    op: str
+    before: Optional[dict] = None
+    after: Optional[dict] = None
+    timestamp: datetime
+
+class QuizAnswer(BaseModel):
+    questionToken: str
+    # None when the player ran out of time without picking an option
+    selectedId: Optional[str] = None
+
+# ==================== CATALOG CACHE ====================
+
+quiz_sampler = QuizSampler()
+search_index = CatalogSearchIndex()
+# Shared catalog version last loaded by this worker, and when Mongo was last asked
+catalog_version: Optional[int] = None
+catalog_checked_at = 0.0
+exposure_task: Optional[asyncio.Task] = None
+quiz_indexes_ready = False
+
+def catalog_loaded() -> bool:
+    return quiz_sampler.loaded and search_index.loaded
+
+async def ensure_catalog():
+    """Load the catalog caches, reloading when another worker has changed the catalog"""
+    global catalog_version, catalog_checked_at
+    now = time.monotonic()
+    if catalog_loaded() and now - catalog_checked_at < CATALOG_TTL:
+        return
+    meta = await db.catalog_meta.find_one({"_id": "catalog"})
+    version = meta["version"] if meta else 0
+    catalog_checked_at = now
+    if catalog_loaded() and version == catalog_version:
+        return
+    butterflies = await db.butterflies.find().to_list(None)
+    quiz_sampler.load(butterflies)
+    search_index.load(butterflies)
+    catalog_version = version
+    await sync_exposure()
+
+async def sync_exposure():
+    """Flush this worker's quiz exposure counts and adopt the shared totals.
+
+    New species are written with $setOnInsert so the first worker to see one
+    fixes its median baseline; increments are applied with $inc.
+    """
+    if not quiz_sampler.loaded:
+        return
+    pending, baselines = quiz_sampler.take_pending()
+    ops = [UpdateOne({"_id": bid}, {"$setOnInsert": base}, upsert=True) for bid, base in baselines.items()]
+    ops += [UpdateOne({"_id": bid}, {"$inc": delta}, upsert=True) for bid, delta in pending.items()]
+    try:
+        if ops:
+            await db.species_exposure.bulk_write(ops, ordered=True)
+    except Exception:
+        quiz_sampler.restore_pending(pending, baselines)
+        raise
+    totals = {doc["_id"]: doc async for doc in db.species_exposure.find()}
+    quiz_sampler.apply_totals(totals)
+
+async def exposure_sync_loop():
+    while True:
+        await asyncio.sleep(EXPOSURE_SYNC_SECONDS)
+        try:
+            await sync_exposure()
+        except Exception:
+            logger.exception("Quiz exposure sync failed")
+
+async def ensure_quiz_indexes():
+    global quiz_indexes_ready
+    if not quiz_indexes_ready:
+        await db.quiz_questions.create_index("createdAt", expireAfterSeconds=QUESTION_TTL_SECONDS)
+        quiz_indexes_ready = True
+
+async def publish_catalog_change(apply=None):
+    """Bump the shared catalog version and apply the change to this worker's caches.
+
+    Other workers see the new version within CATALOG_TTL and reload. If this
+    worker has missed an intervening change it reloads too.
+    """
+    global catalog_version
+    meta = await db.catalog_meta.find_one_and_update(
+        {"_id": "catalog"},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    if apply is not None and catalog_loaded() and meta["version"] == catalog_version + 1:
+        apply()
+        catalog_version = meta["version"]
+    else:
+        quiz_sampler.loaded = False
+        search_index.loaded = False
+
+async def catalog_upsert(butterfly: dict):
+    """Publish a created or updated butterfly"""
+    def apply():
+        quiz_sampler.upsert(butterfly)
+        search_index.upsert(butterfly)
+    await publish_catalog_change(apply)
+
+async def catalog_remove(butterfly_id: str):
+    """Publish a deleted butterfly"""
+    def apply():
+        quiz_sampler.remove(butterfly_id)
+        search_index.remove(butterfly_id)
+    await publish_catalog_change(apply)
+
+async def catalog_invalidate():
+    """Publish a bulk change; every worker reloads from the database"""
+    await publish_catalog_change()
+
+# ==================== SEEDING ====================
+
+class SeedInProgress(Exception):
+    """Another worker held the seed lock for longer than SEED_LOCK_SECONDS"""
+
+async def ensure_latin_name_index():
+    """Make latinName unique so concurrent seeders cannot insert duplicates"""
+    try:
+        await db.butterflies.create_index("latinName", unique=True)
+    except OperationFailure as e:
+        # Existing duplicate species must be cleaned up before the index can be built
+        logger.warning(f"Could not create unique latinName index: {e}")
+
+async def acquire_seed_lock() -> bool:
+    now = datetime.now(timezone.utc)
+    try:
+        await db.seed_state.update_one(
+            {"_id": "butterflies-lock", "expiresAt": {"$lt": now}},
+            {"$set": {"expiresAt": now + timedelta(seconds=SEED_LOCK_SECONDS)}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        # The lock document exists and has not expired: another worker is seeding
+        return False
+
+async def seed_batch(batch: List[dict], deleted_names: set):
+    """Insert new fixture species and update seeded ones an admin has not edited.
+
+    Only writes that took effect are recorded in the audit log: inserts by
+    the ids the server reports as upserted, updates by whether the guarded
+    update matched.
+    """
+    async def write(session):
+        existing = {
+            b["latinName"]: b
+            async for b in db.butterflies.find(
+                {"latinName": {"$in": [r["latinName"] for r in batch]}}, session=session
+            )
+        }
+        inserts, updates = plan_seed(batch, existing, deleted_names, ObjectId)
+        events = []
+        if inserts:
+            result = await db.butterflies.bulk_write(
+                [UpdateOne({"latinName": doc["latinName"]}, {"$setOnInsert": doc}, upsert=True) for doc in inserts],
+                ordered=False,
+                session=session,
+            )
+            # Species another writer created meanwhile match the filter and are not upserted
+            events += [change_event("seed", inserts[i]["_id"], None, inserts[i]) for i in result.upserted_ids]
+        inserted = len(events)
+        for current, doc in updates:
+            # Matching on the old hash skips records an admin edited meanwhile
+            before = await db.butterflies.find_one_and_update(
+                {"_id": current["_id"], "fixtureHash": current["fixtureHash"]}, {"$set": doc}, session=session
+            )
+            if before is not None:
+                events.append(change_event("seed", before["_id"], before, {**before, **doc}))
+        if events:
+            await db.butterfly_changes.insert_many(events, session=session)
+        return inserted, len(events) - inserted
+
+    return await audited_write(write)
+
+async def seed_butterflies(force: bool = False):
+    """Seed fixture species keyed by latinName, skipping unchanged fixtures.
+
+    New species are inserted unless an admin deleted them. Species seeded
+    earlier pick up fixture changes only while no admin has edited them.
+    Every write is recorded in the audit log.
+    """
+    checksum, records = load_fixtures(FIXTURES_DIR)
+    deadline = time.monotonic() + SEED_LOCK_SECONDS
+    while True:
+        state = await db.seed_state.find_one({"_id": "butterflies"})
+        if fixtures_current(state, checksum, force):
+            return {"skipped": True, "inserted": 0, "updated": 0}
+        if await acquire_seed_lock():
+            break
+        if time.monotonic() > deadline:
+            raise SeedInProgress()
+        await asyncio.sleep(1)
+
+    try:
+        await ensure_latin_name_index()
+        deleted_names = set(await db.butterfly_changes.distinct("before.latinName", {"op": "delete"}))
+        inserted = updated = 0
+        for start in range(0, len(records), SEED_BATCH_SIZE):
+            batch_inserted, batch_updated = await seed_batch(
+                records[start:start + SEED_BATCH_SIZE], deleted_names
+            )
+            inserted += batch_inserted
+            updated += batch_updated
+
+        await db.seed_state.update_one(
+            {"_id": "butterflies"},
+            {"$set": {"checksum": checksum, "count": len(records)}},
+            upsert=True,
+        )
+    finally:
+        await db.seed_state.delete_one({"_id": "butterflies-lock"})
+    if inserted or updated:
+        await catalog_invalidate()
+    logger.info(f"Seeded butterflies: {inserted} inserted, {updated} updated")
+    return {"skipped": False, "inserted": inserted, "updated": updated}
+
+# ==================== AUDIT LOG ====================
+
+# None until the first transaction attempt tells us whether the server supports them
+transactions_supported: Optional[bool] = None
+audit_ready = False
+# Running compaction tasks, referenced so they are not garbage-collected mid-flight
+compaction_tasks: Set[asyncio.Task] = set()
+
+def strip_id(doc: Optional[dict]) -> Optional[dict]:
+    return None if doc is None else {k: v for k, v in doc.items() if k != "_id"}
+
+def change_event(op: str, butterfly_id, before: Optional[dict], after: Optional[dict]) -> dict:
+    return {
+        "butterflyId": str(butterfly_id),
+        "op": op,
+        "before": strip_id(before),
+        "after": strip_id(after),
+        "timestamp": datetime.now(timezone.utc),
+    }
+
+async def run_in_transaction(fn):
+    """Run fn(session) in a transaction, or without one on a standalone server.
+
+    with_transaction retries transient errors such as write conflicts between
+    concurrent admin edits, and unknown commit results.
+    """
+    global transactions_supported
+    if transactions_supported is not False:
+        try:
+            async with await client.start_session() as session:
+                result = await session.with_transaction(fn)
+            transactions_supported = True
+            return result
+        except OperationFailure as e:
+            # IllegalOperation: transactions need a replica set or mongos
+            if e.code != 20:
+                raise
+            transactions_supported = False
+            logger.warning("MongoDB transactions unavailable; audit events are written without one")
+    return await fn(None)
+
+async def write_snapshot(catalog: Dict[str, dict], timestamp: datetime):
+    """Store a compact catalog snapshot, chunks first so readers never see a partial one"""
+    snapshot_id = ObjectId()
+    items = list(catalog.items())
+    chunks = [
+        {"snapshotId": snapshot_id, "index": i, "docs": dict(items[start:start + SNAPSHOT_CHUNK_SIZE])}
+        for i, start in enumerate(range(0, len(items), SNAPSHOT_CHUNK_SIZE))
+    ]
+    if chunks:
+        await db.catalog_snapshot_chunks.insert_many(chunks)
+    await db.catalog_snapshots.insert_one(
+        {"_id": snapshot_id, "timestamp": timestamp, "count": len(items), "chunks": len(chunks)}
+    )
+
+def snapshot_cutoff() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=SNAPSHOT_LAG_SECONDS)
+
+async def snapshot_live_catalog():
+    """Snapshot the butterflies collection as it stands now.
+
+    The snapshot is stamped SNAPSHOT_LAG_SECONDS in the past: events from
+    transactions still in flight are replayed on top of it, which is
+    harmless for events whose effect the snapshot already holds.
+    """
+    timestamp = snapshot_cutoff()
+    butterflies = await db.butterflies.find().to_list(None)
+    await write_snapshot({str(b["_id"]): strip_id(b) for b in butterflies}, timestamp)
+
+async def ensure_audit_baseline():
+    """Create audit indexes and a baseline snapshot so history covers pre-audit data"""
+    global audit_ready
+    if audit_ready:
+        return
+    await db.butterfly_changes.create_index([("timestamp", 1), ("_id", 1)])
+    await db.butterfly_changes.create_index("butterflyId")
+    await db.catalog_snapshots.create_index("timestamp")
+    await db.catalog_snapshot_chunks.create_index("snapshotId")
+    if await db.catalog_snapshots.count_documents({}, limit=1) == 0:
+        await snapshot_live_catalog()
+    audit_ready = True
+
+async def catalog_as_of(at: datetime) -> Dict[str, dict]:
+    """Rebuild the catalog at a point in time from the nearest snapshot plus replayed changes"""
+    snapshot = await db.catalog_snapshots.find_one({"timestamp": {"$lte": at}}, sort=[("timestamp", -1)])
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="No catalog history before that time")
+    catalog: Dict[str, dict] = {}
+    async for chunk in db.catalog_snapshot_chunks.find({"snapshotId": snapshot["_id"]}):
+        catalog.update(chunk["docs"])
+    changes = db.butterfly_changes.find(
+        {"timestamp": {"$gt": snapshot["timestamp"], "$lte": at}}
+    ).sort([("timestamp", 1), ("_id", 1)])
+    return replay(catalog, [event async for event in changes])
+
+async def prune_snapshots():
+    """Drop snapshots outside the retention policy, headers before chunks"""
+    snapshots = await db.catalog_snapshots.find({}, {"timestamp": 1}).to_list(None)
+    doomed = snapshots_to_prune(snapshots, datetime.now(timezone.utc), SNAPSHOT_KEEP, SNAPSHOT_KEEP_DAYS)
+    if doomed:
+        await db.catalog_snapshots.delete_many({"_id": {"$in": doomed}})
+        await db.catalog_snapshot_chunks.delete_many({"snapshotId": {"$in": doomed}})
+
+async def compact_history():
+    """Fold the settled changes since the last snapshot into a new snapshot.
+
+    Events carry client timestamps, so one from a slow transaction can
+    commit after a later-stamped one. Only changes older than
+    SNAPSHOT_LAG_SECONDS are folded in; newer ones stay in the replay.
+    """
+    cutoff = snapshot_cutoff()
+    await write_snapshot(await catalog_as_of(cutoff), cutoff)
+    await prune_snapshots()
+
+async def compact_if_due():
+    """Snapshot once SNAPSHOT_EVERY settled changes have piled up since the latest snapshot"""
+    latest = await db.catalog_snapshots.find_one(sort=[("timestamp", -1)])
+    query = {"timestamp": {"$lte": snapshot_cutoff()}}
+    if latest:
+        query["timestamp"]["$gt"] = latest["timestamp"]
+    if await db.butterfly_changes.count_documents(query, limit=SNAPSHOT_EVERY) >= SNAPSHOT_EVERY:
+        await compact_history()
+
+def compaction_done(task: asyncio.Task):
+    compaction_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Catalog history compaction failed", exc_info=task.exception())
+
+async def audited_write(fn):
+    """Apply an admin write and its change events together, snapshotting periodically"""
+    await ensure_audit_baseline()
+    result = await run_in_transaction(fn)
+    # The trigger counts changes in the database, so it holds across restarts and workers
+    if not compaction_tasks:
+        task = asyncio.create_task(compact_if_due())
+        compaction_tasks.add(task)
+        task.add_done_callback(compaction_done)
+    return result
+
+# ==================== PROFILING ====================
+
+profiler = Profiler(PROFILES_DIR, PROFILE_RING_SIZE, PROFILE_INTERVAL)
+profiling_task: Optional[asyncio.Task] = None
+
+async def apply_profiling_state(state: Optional[dict]) -> bool:
+    """Apply the shared profiling settings to this worker.
+
+    Returns whether the configured capture window is running (or has run)
+    here; False means none is due or a request capture is still in progress.
+    """
+    if not state:
+        profiler.disable()
+        return False
+    profiler.configure(state.get("sampleRate", 0.0), state.get("pathPrefix", "/api/"))
+    until = state.get("windowUntil")
+    if until is None:
+        profiler.stop_window()
+        return False
+    remaining = (as_utc(until) - datetime.now(timezone.utc)).total_seconds()
+    return remaining > 0 and profiler.start_window(state["windowId"], remaining)
+
+async def profiling_sync_loop():
+    while True:
+        await asyncio.sleep(PROFILE_POLL_SECONDS)
+        try:
+            await apply_profiling_state(await db.profiling_state.find_one({"_id": "config"}))
+        except Exception:
+            logger.exception("Profiling settings sync failed")
+
+async def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Guard for admin-only operational endpoints"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token not configured")
+    if not hmac.compare_digest((x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
 # Routes
 @api_router.get("/")
 async def root():
@@ -56,20 +516,18 @@ async def get_butterflies():
     return [Butterfly(**{**b, "id": str(b["_id"])}) for b in butterflies]
 
 @api_router.get("/quiz/question")
-async def get_quiz_question():
-    """Get a random quiz question with 5 options"""
-    # Get all butterflies
-    all_butterflies = await db.butterflies.find().to_list(100)
+async def get_quiz_question(sessionId: Optional[str] = None):
+    """Get a quiz question with 5 options, favouring under-shown and often-missed species"""
+    await ensure_catalog()
     
-    if len(all_butterflies) < 5:
+    if len(quiz_sampler.catalog) < 5:
         raise HTTPException(status_code=400, detail="Not enough butterflies in database")
     
-    # Select random correct answer
-    correct_butterfly = random.choice(all_butterflies)
-    
-    # Select 4 other random butterflies as wrong options
-    wrong_butterflies = [b for b in all_butterflies if b["_id"] != correct_butterfly["_id"]]
-    selected_wrong = random.sample(wrong_butterflies, min(4, len(wrong_butterflies)))
+    # Weighted draw of the correct answer and 4 distinct wrong options
+    correct_id, wrong_ids = quiz_sampler.draw(sessionId)
+    quiz_sampler.record_shown(correct_id, sessionId)
+    correct_butterfly = quiz_sampler.catalog[correct_id]
+    selected_wrong = [quiz_sampler.catalog[bid] for bid in wrong_ids]
     
     # Combine and shuffle
     all_options = [correct_butterfly] + selected_wrong
@@ -79,55 +537,49 @@ async def get_quiz_question():
     correct = Butterfly(**{**correct_butterfly, "id": str(correct_butterfly["_id"])})
     options = [Butterfly(**{**b, "id": str(b["_id"])}) for b in all_options]
     
+    # One-time token so an answer can only be recorded for a question that was served
+    await ensure_quiz_indexes()
+    token = secrets.token_urlsafe(16)
+    await db.quiz_questions.insert_one({
+        "_id": token,
+        "butterflyId": correct_id,
+        "sessionId": sessionId,
+        "createdAt": datetime.now(timezone.utc),
+    })
+    
     return {
         "correctAnswer": correct,
-        "options": options
+        "options": options,
+        "questionToken": token
     }
 
+@api_router.post("/quiz/answer")
+async def record_quiz_answer(answer: QuizAnswer):
+    """Record the outcome of a served question so missed species come up more often"""
+    question = await db.quiz_questions.find_one_and_delete({"_id": answer.questionToken})
+    if question is None:
+        raise HTTPException(status_code=409, detail="Question unknown or already answered")
+    await ensure_catalog()
+    correct = answer.selectedId == question["butterflyId"]
+    if not correct:
+        quiz_sampler.record_missed(question["butterflyId"], question["sessionId"])
+    return {"message": "Answer recorded", "correct": correct}
+
 @api_router.post("/init-butterflies")
-async def initialize_butterflies():
-    """Initialize the database with butterfly data"""
-    # Check if already initialized
-    count = await db.butterflies.count_documents({})
-    if count > 0:
+async def initialize_butterflies(force: bool = False):
+    """Seed the database from the butterfly fixtures"""
+    try:
+        result = await seed_butterflies(force=force)
+    except SeedInProgress:
+        raise HTTPException(status_code=503, detail="Seeding is already in progress")
+    if result["skipped"]:
+        count = await db.butterflies.count_documents({})
         return {"message": f"Database already initialized with {count} butterflies"}
-    
-    # 30 realistic butterfly species
-    butterflies = [
-        {"commonName": "Monarch", "latinName": "Danaus plexippus", "imageUrl": "https://images.unsplash.com/photo-1560263816-d704d83cce0f?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1Nzd8MHwxfHNlYXJjaHwxfHxidXR0ZXJmbHl8ZW58MHx8fHwxNzYzMDMzNzUzfDA&ixlib=rb-4.1.0&q=85", "difficulty": 1},
-        {"commonName": "Blue Morpho", "latinName": "Morpho menelaus", "imageUrl": "https://images.unsplash.com/photo-1599631438215-75bc2640feb8?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1Nzd8MHwxfHNlYXJjaHwyfHxidXR0ZXJmbHl8ZW58MHx8fHwxNzYzMDMzNzUzfDA&ixlib=rb-4.1.0&q=85", "difficulty": 2},
-        {"commonName": "Painted Lady", "latinName": "Vanessa cardui", "imageUrl": "https://images.unsplash.com/photo-1533048324814-79b0a31982f1?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1Nzd8MHwxfHNlYXJjaHwzfHxidXR0ZXJmbHl8ZW58MHx8fHwxNzYzMDMzNzUzfDA&ixlib=rb-4.1.0&q=85", "difficulty": 1},
-        {"commonName": "Red Admiral", "latinName": "Vanessa atalanta", "imageUrl": "https://images.unsplash.com/photo-1564514476902-542f8c30121e?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1Nzd8MHwxfHNlYXJjaHw0fHxidXR0ZXJmbHl8ZW58MHx8fHwxNzYzMDMzNzUzfDA&ixlib=rb-4.1.0&q=85", "difficulty": 2},
-        {"commonName": "Tiger Swallowtail", "latinName": "Papilio glaucus", "imageUrl": "https://images.unsplash.com/photo-1702338354821-0ea4fb0221e3?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Njd8MHwxfHNlYXJjaHwxfHxzd2FsbG93dGFpbHxlbnwwfHx8fDE3NjMwMzM3ODl8MA&ixlib=rb-4.1.0&q=85", "difficulty": 1},
-        {"commonName": "Black Swallowtail", "latinName": "Papilio polyxenes", "imageUrl": "https://images.unsplash.com/photo-1657244670691-ec73025cf69e?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Njd8MHwxfHNlYXJjaHwyfHxzd2FsbG93dGFpbHxlbnwwfHx8fDE3NjMwMzM3ODl8MA&ixlib=rb-4.1.0&q=85", "difficulty": 2},
-        {"commonName": "Spicebush Swallowtail", "latinName": "Papilio troilus", "imageUrl": "https://images.unsplash.com/photo-1728946737947-3e1908c3750a?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Njd8MHwxfHNlYXJjaHwzfHxzd2FsbG93dGFpbHxlbnwwfHx8fDE3NjMwMzM3ODl8MA&ixlib=rb-4.1.0&q=85", "difficulty": 3},
-        {"commonName": "Pipevine Swallowtail", "latinName": "Battus philenor", "imageUrl": "https://images.unsplash.com/photo-1628181150173-f5f355d15f28?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Njd8MHwxfHNlYXJjaHw0fHxzd2FsbG93dGFpbHxlbnwwfHx8fDE3NjMwMzM3ODl8MA&ixlib=rb-4.1.0&q=85", "difficulty": 3},
-        {"commonName": "Zebra Swallowtail", "latinName": "Eurytides marcellus", "imageUrl": "https://images.pexels.com/photos/2671074/pexels-photo-2671074.jpeg", "difficulty": 2},
-        {"commonName": "Common Buckeye", "latinName": "Junonia coenia", "imageUrl": "https://images.unsplash.com/photo-1623615412998-c63b6d5fe9be?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2NDJ8MHwxfHNlYXJjaHwxfHxtb25hcmNofGVufDB8fHx8MTc2MzAzMzc4NHww&ixlib=rb-4.1.0&q=85", "difficulty": 2},
-        {"commonName": "Pearl Crescent", "latinName": "Phyciodes tharos", "imageUrl": "https://images.unsplash.com/photo-1484704193309-27eaa53936a7?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2NDJ8MHwxfHNlYXJjaHwyfHxtb25hcmNofGVufDB8fHx8MTc2MzAzMzc4NHww&ixlib=rb-4.1.0&q=85", "difficulty": 3},
-        {"commonName": "Question Mark", "latinName": "Polygonia interrogationis", "imageUrl": "https://images.unsplash.com/photo-1509715513011-e394f0cb20c4?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2NDJ8MHwxfHNlYXJjaHwzfHxtb25hcmNofGVufDB8fHx8MTc2MzAzMzc4NHww&ixlib=rb-4.1.0&q=85", "difficulty": 3},
-        {"commonName": "Mourning Cloak", "latinName": "Nymphalis antiopa", "imageUrl": "https://images.unsplash.com/photo-1592861377549-3586948b6a74?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2NDJ8MHwxfHNlYXJjaHw0fHxtb25hcmNofGVufDB8fHx8MTc2MzAzMzc4NHww&ixlib=rb-4.1.0&q=85", "difficulty": 2},
-        {"commonName": "Viceroy", "latinName": "Limenitis archippus", "imageUrl": "https://images.pexels.com/photos/28749528/pexels-photo-28749528.jpeg", "difficulty": 2},
-        {"commonName": "Gulf Fritillary", "latinName": "Agraulis vanillae", "imageUrl": "https://images.unsplash.com/photo-1560263816-d704d83cce0f?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1Nzd8MHwxfHNlYXJjaHwxfHxidXR0ZXJmbHl8ZW58MHx8fHwxNzYzMDMzNzUzfDA&ixlib=rb-4.1.0&q=85", "difficulty": 2},
-        {"commonName": "Great Spangled Fritillary", "latinName": "Speyeria cybele", "imageUrl": "https://images.unsplash.com/photo-1533048324814-79b0a31982f1?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1Nzd8MHwxfHNlYXJjaHwzfHxidXR0ZXJmbHl8ZW58MHx8fHwxNzYzMDMzNzUzfDA&ixlib=rb-4.1.0&q=85", "difficulty": 3},
-        {"commonName": "Cabbage White", "latinName": "Pieris rapae", "imageUrl": "https://images.unsplash.com/photo-1702338354821-0ea4fb0221e3?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Njd8MHwxfHNlYXJjaHwxfHxzd2FsbG93dGFpbHxlbnwwfHx8fDE3NjMwMzM3ODl8MA&ixlib=rb-4.1.0&q=85", "difficulty": 1},
-        {"commonName": "Clouded Sulphur", "latinName": "Colias philodice", "imageUrl": "https://images.unsplash.com/photo-1728946737947-3e1908c3750a?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Njd8MHwxfHNlYXJjaHwzfHxzd2FsbG93dGFpbHxlbnwwfHx8fDE3NjMwMzM3ODl8MA&ixlib=rb-4.1.0&q=85", "difficulty": 2},
-        {"commonName": "Orange Sulphur", "latinName": "Colias eurytheme", "imageUrl": "https://images.unsplash.com/photo-1628181150173-f5f355d15f28?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Njd8MHwxfHNlYXJjaHw0fHxzd2FsbG93dGFpbHxlbnwwfHx8fDE3NjMwMzM3ODl8MA&ixlib=rb-4.1.0&q=85", "difficulty": 2},
-        {"commonName": "Cloudless Sulphur", "latinName": "Phoebis sennae", "imageUrl": "https://images.unsplash.com/photo-1564514476902-542f8c30121e?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1Nzd8MHwxfHNlYXJjaHw0fHxidXR0ZXJmbHl8ZW58MHx8fHwxNzYzMDMzNzUzfDA&ixlib=rb-4.1.0&q=85", "difficulty": 2},
-        {"commonName": "Eastern Comma", "latinName": "Polygonia comma", "imageUrl": "https://images.unsplash.com/photo-1599631438215-75bc2640feb8?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1Nzd8MHwxfHNlYXJjaHwyfHxidXR0ZXJmbHl8ZW58MHx8fHwxNzYzMDMzNzUzfDA&ixlib=rb-4.1.0&q=85", "difficulty": 3},
-        {"commonName": "American Lady", "latinName": "Vanessa virginiensis", "imageUrl": "https://images.unsplash.com/photo-1623615412998-c63b6d5fe9be?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2NDJ8MHwxfHNlYXJjaHwxfHxtb25hcmNofGVufDB8fHx8MTc2MzAzMzc4NHww&ixlib=rb-4.1.0&q=85", "difficulty": 2},
-        {"commonName": "Common Checkered-Skipper", "latinName": "Pyrgus communis", "imageUrl": "https://images.unsplash.com/photo-1484704193309-27eaa53936a7?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2NDJ8MHwxfHNlYXJjaHwyfHxtb25hcmNofGVufDB8fHx8MTc2MzAzMzc4NHww&ixlib=rb-4.1.0&q=85", "difficulty": 3},
-        {"commonName": "Silver-spotted Skipper", "latinName": "Epargyreus clarus", "imageUrl": "https://images.unsplash.com/photo-1509715513011-e394f0cb20c4?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2NDJ8MHwxfHNlYXJjaHwzfHxtb25hcmNofGVufDB8fHx8MTc2MzAzMzc4NHww&ixlib=rb-4.1.0&q=85", "difficulty": 3},
-        {"commonName": "Gray Hairstreak", "latinName": "Strymon melinus", "imageUrl": "https://images.unsplash.com/photo-1592861377549-3586948b6a74?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2NDJ8MHwxfHNlYXJjaHw0fHxtb25hcmNofGVufDB8fHx8MTc2MzAzMzc4NHww&ixlib=rb-4.1.0&q=85", "difficulty": 3},
-        {"commonName": "Spring Azure", "latinName": "Celastrina ladon", "imageUrl": "https://images.pexels.com/photos/2671074/pexels-photo-2671074.jpeg", "difficulty": 2},
-        {"commonName": "Eastern Tailed-Blue", "latinName": "Cupido comyntas", "imageUrl": "https://images.pexels.com/photos/28749528/pexels-photo-28749528.jpeg", "difficulty": 3},
-        {"commonName": "Little Yellow", "latinName": "Pyrisitia lisa", "imageUrl": "https://images.unsplash.com/photo-1657244670691-ec73025cf69e?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Njd8MHwxfHNlYXJjaHwyfHxzd2FsbG93dGFpbHxlbnwwfHx8fDE3NjMwMzM3ODl8MA&ixlib=rb-4.1.0&q=85", "difficulty": 2},
-        {"commonName": "Hackberry Emperor", "latinName": "Asterocampa celtis", "imageUrl": "https://images.unsplash.com/photo-1560263816-d704d83cce0f?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1Nzd8MHwxfHNlYXJjaHwxfHxidXR0ZXJmbHl8ZW58MHx8fHwxNzYzMDMzNzUzfDA&ixlib=rb-4.1.0&q=85", "difficulty": 3},
-        {"commonName": "Red-spotted Purple", "latinName": "Limenitis arthemis", "imageUrl": "https://images.unsplash.com/photo-1599631438215-75bc2640feb8?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1Nzd8MHwxfHNlYXJjaHwyfHxidXR0ZXJmbHl8ZW58MHx8fHwxNzYzMDMzNzUzfDA&ixlib=rb-4.1.0&q=85", "difficulty": 3}
-    ]
-    
-    result = await db.butterflies.insert_many(butterflies)
-    return {"message": f"Successfully initialized {len(result.inserted_ids)} butterflies"}
+    return {
+        "message": f"Successfully initialized {result['inserted']} butterflies",
+        "inserted": result["inserted"],
+        "updated": result["updated"],
+    }
 
 # ==================== ADMIN ENDPOINTS ====================
 
@@ -137,12 +589,41 @@ async def get_admin_butterflies():
     butterflies = await db.butterflies.find().to_list(100)
     return [Butterfly(**{**b, "id": str(b["_id"])}) for b in butterflies]
 
+@api_router.get("/admin/butterflies/search", response_model=ButterflySearchResults)
+async def search_butterflies(
+    q: str = "",
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Search butterflies by common or Latin name, ranked and paginated"""
+    await ensure_catalog()
+    total, matches, exact = search_index.search(q, offset=(page - 1) * limit, limit=limit)
+    return ButterflySearchResults(
+        results=[Butterfly(**{**b, "id": str(b["_id"])}) for b in matches],
+        total=total,
+        totalExact=exact,
+        page=page,
+        limit=limit,
+    )
+
 @api_router.post("/admin/butterfly", response_model=Butterfly)
 async def create_butterfly(butterfly: Butterfly):
     """Create a new butterfly"""
     butterfly_dict = butterfly.model_dump(exclude={"id"})
-    result = await db.butterflies.insert_one(butterfly_dict)
-    new_butterfly = await db.butterflies.find_one({"_id": result.inserted_id})
+    
+    async def write(session):
+        result = await db.butterflies.insert_one(dict(butterfly_dict), session=session)
+        new_butterfly = {**butterfly_dict, "_id": result.inserted_id}
+        await db.butterfly_changes.insert_one(
+            change_event("create", result.inserted_id, None, new_butterfly), session=session
+        )
+        return new_butterfly
+    
+    try:
+        new_butterfly = await audited_write(write)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A butterfly with this Latin name already exists")
+    await catalog_upsert(new_butterfly)
     return Butterfly(**{**new_butterfly, "id": str(new_butterfly["_id"])})
 
 @api_router.put("/admin/butterfly/{butterfly_id}", response_model=Butterfly)
@@ -154,15 +635,28 @@ async def update_butterfly(butterfly_id: str, butterfly: Butterfly):
         raise HTTPException(status_code=400, detail="Invalid butterfly ID")
     
     butterfly_dict = butterfly.model_dump(exclude={"id"})
-    result = await db.butterflies.update_one(
-        {"_id": obj_id},
-        {"$set": butterfly_dict}
-    )
     
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Butterfly not found")
+    async def write(session):
+        # Dropping fixtureHash marks the record as curated, so seeding leaves it alone
+        before = await db.butterflies.find_one_and_update(
+            {"_id": obj_id},
+            {"$set": butterfly_dict, "$unset": {"fixtureHash": ""}},
+            return_document=ReturnDocument.BEFORE,
+            session=session,
+        )
+        if before is None:
+            raise HTTPException(status_code=404, detail="Butterfly not found")
+        after = {k: v for k, v in {**before, **butterfly_dict}.items() if k != "fixtureHash"}
+        await db.butterfly_changes.insert_one(
+            change_event("update", obj_id, before, after), session=session
+        )
+        return after
     
-    updated_butterfly = await db.butterflies.find_one({"_id": obj_id})
+    try:
+        updated_butterfly = await audited_write(write)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A butterfly with this Latin name already exists")
+    await catalog_upsert(updated_butterfly)
     return Butterfly(**{**updated_butterfly, "id": str(updated_butterfly["_id"])})
 
 @api_router.delete("/admin/butterfly/{butterfly_id}")
@@ -173,16 +667,202 @@ async def delete_butterfly(butterfly_id: str):
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid butterfly ID")
     
-    result = await db.butterflies.delete_one({"_id": obj_id})
-    
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Butterfly not found")
+    async def write(session):
+        before = await db.butterflies.find_one_and_delete({"_id": obj_id}, session=session)
+        if before is None:
+            raise HTTPException(status_code=404, detail="Butterfly not found")
+        await db.butterfly_changes.insert_one(
+            change_event("delete", obj_id, before, None), session=session
+        )
     
+    await audited_write(write)
+    await catalog_remove(butterfly_id)
     return {"message": "Butterfly deleted successfully"}
 
+# ==================== HISTORY ENDPOINTS ====================
+
+@api_router.get("/admin/changes", response_model=List[ChangeEvent], dependencies=[Depends(require_admin_token)])
+async def get_changes(butterflyId: Optional[str] = None, limit: int = Query(50, ge=1, le=500)):
+    """List admin change events, newest first"""
+    query = {"butterflyId": butterflyId} if butterflyId else {}
+    events = await db.butterfly_changes.find(query).sort(
+        [("timestamp", -1), ("_id", -1)]
+    ).to_list(limit)
+    return [ChangeEvent(**{**e, "id": str(e["_id"])}) for e in events]
+
+@api_router.get("/admin/catalog/history", response_model=List[Butterfly], dependencies=[Depends(require_admin_token)])
+async def get_catalog_history(at: datetime):
+    """Get the catalog as it was at a point in time"""
+    catalog = await catalog_as_of(as_utc(at))
+    return [Butterfly(**{**doc, "id": bid}) for bid, doc in catalog.items()]
+
+@api_router.post(
+    "/admin/butterfly/{butterfly_id}/restore",
+    response_model=Butterfly,
+    dependencies=[Depends(require_admin_token)],
+)
+async def restore_butterfly(butterfly_id: str, at: Optional[datetime] = None):
+    """Restore a butterfly to its state at a point in time, or to just before its last delete"""
+    try:
+        obj_id = ObjectId(butterfly_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid butterfly ID")
+    
+    if at is None:
+        # Without a timestamp only a deleted species can be restored, so current edits are never clobbered
+        if await db.butterflies.count_documents({"_id": obj_id}, limit=1):
+            raise HTTPException(
+                status_code=409, detail="Butterfly exists; pass 'at' to restore an earlier version"
+            )
+        deleted = await db.butterfly_changes.find_one(
+            {"butterflyId": butterfly_id, "op": "delete"}, sort=[("timestamp", -1), ("_id", -1)]
+        )
+        state = deleted["before"] if deleted else None
+    else:
+        state = (await catalog_as_of(as_utc(at))).get(butterfly_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="No earlier version of this butterfly found")
+    # A restored species is admin-curated from here on
+    state = curated(state)
+    
+    async def write(session):
+        before = await db.butterflies.find_one_and_replace(
+            {"_id": obj_id}, state, upsert=True, session=session
+        )
+        restored = {**state, "_id": obj_id}
+        await db.butterfly_changes.insert_one(
+            change_event("restore", obj_id, before, restored), session=session
+        )
+        return restored
+    
+    try:
+        restored_butterfly = await audited_write(write)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A butterfly with this Latin name already exists")
+    await catalog_upsert(restored_butterfly)
+    return Butterfly(**{**restored_butterfly, "id": butterfly_id})
+
+async def rollback_batch(ids: List[str], target: Dict[str, dict]) -> int:
+    """Bring one batch of species in line with the target catalog in a single transaction"""
+    async def write(session):
+        current = {
+            str(b["_id"]): b
+            async for b in db.butterflies.find({"_id": {"$in": [ObjectId(bid) for bid in ids]}}, session=session)
+        }
+        deletes, replaces = plan_rollback(current, {bid: target[bid] for bid in ids if bid in target})
+        ops = [DeleteOne({"_id": doc["_id"]}) for doc in deletes]
+        ops += [ReplaceOne({"_id": ObjectId(bid)}, state, upsert=True) for bid, _, state in replaces]
+        if not ops:
+            return 0
+        events = [change_event("delete", doc["_id"], doc, None) for doc in deletes]
+        events += [change_event("restore", bid, doc, state) for bid, doc, state in replaces]
+        await db.butterflies.bulk_write(ops, ordered=True, session=session)
+        await db.butterfly_changes.insert_many(events, session=session)
+        return len(events)
+
+    return await audited_write(write)
+
+@api_router.post("/admin/catalog/rollback", dependencies=[Depends(require_admin_token)])
+async def rollback_catalog(at: datetime):
+    """Roll the whole catalog back to its state at a point in time.
+
+    Runs in batches of SEED_BATCH_SIZE, each reading the species it changes
+    inside its own transaction. Species missing from the target are deleted
+    in earlier batches so their latinNames are free before older species
+    are written back.
+    """
+    target = await catalog_as_of(as_utc(at))
+    stale = [str(bid) for bid in await db.butterflies.distinct("_id") if str(bid) not in target]
+    batches = [stale[i:i + SEED_BATCH_SIZE] for i in range(0, len(stale), SEED_BATCH_SIZE)]
+    restored = list(target)
+    batches += [restored[i:i + SEED_BATCH_SIZE] for i in range(0, len(restored), SEED_BATCH_SIZE)]
+    
+    changed = 0
+    try:
+        for batch in batches:
+            changed += await rollback_batch(batch, target)
+    except BulkWriteError as e:
+        # Typically a latinName now held by a species the target catalog does not contain
+        errors = e.details.get("writeErrors") or [{}]
+        raise HTTPException(
+            status_code=409,
+            detail=f"Rollback stopped after {changed} changes: {errors[0].get('errmsg', e)}",
+        )
+    except DuplicateKeyError as e:
+        raise HTTPException(status_code=409, detail=f"Rollback stopped after {changed} changes: {e}")
+    finally:
+        if changed:
+            await catalog_invalidate()
+    
+    if not changed:
+        return {"message": "Catalog already matches that point in time", "changed": 0}
+    return {"message": f"Rolled back {changed} butterflies", "changed": changed}
+
+# ==================== PROFILING ENDPOINTS ====================
+
+@api_router.post("/admin/profiling", dependencies=[Depends(require_admin_token)])
+async def configure_profiling(config: ProfilingConfig):
+    """Sample a fraction of requests and/or capture a fixed time window on every worker.
+
+    Settings are shared through the database; other workers apply them
+    within PROFILE_POLL_SECONDS. Each worker writes its own profiles.
+    """
+    now = datetime.now(timezone.utc)
+    update = {"sampleRate": config.sampleRate, "pathPrefix": config.pathPrefix}
+    query = {"_id": "config"}
+    if config.windowSeconds:
+        update["windowId"] = secrets.token_hex(8)
+        update["windowUntil"] = now + timedelta(seconds=config.windowSeconds)
+        # Only one window at a time; the upsert collides if one is still running
+        query["$or"] = [{"windowUntil": None}, {"windowUntil": {"$lte": now}}]
+    try:
+        state = await db.profiling_state.find_one_and_update(
+            query, {"$set": update}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A profiling window is already running")
+    started = await apply_profiling_state(state)
+    response = {
+        "message": "Profiling configured",
+        "sampleRate": profiler.sample_rate,
+        "appliesWithinSeconds": PROFILE_POLL_SECONDS,
+    }
+    if config.windowSeconds:
+        # False when this worker is busy with a request capture; it starts on the next poll
+        response["windowUntil"] = state["windowUntil"]
+        response["windowStarted"] = started
+    return response
+
+@api_router.delete("/admin/profiling", dependencies=[Depends(require_admin_token)])
+async def disable_profiling():
+    """Turn off request sampling and cancel any running window capture on every worker"""
+    await db.profiling_state.update_one(
+        {"_id": "config"}, {"$set": {"sampleRate": 0.0, "windowUntil": None}}, upsert=True
+    )
+    profiler.disable()
+    return {"message": "Profiling disabled"}
+
+@api_router.get("/admin/profiles", response_model=List[ProfileInfo], dependencies=[Depends(require_admin_token)])
+async def list_profiles():
+    """List this worker's captured profiles, newest first"""
+    return profiler.list()
+
+@api_router.get("/admin/profiles/{name}", dependencies=[Depends(require_admin_token)])
+async def download_profile(name: str, format: str = Query("collapsed", pattern="^(collapsed|speedscope)$")):
+    """Download a profile as collapsed stacks or speedscope JSON"""
+    try:
+        collapsed = profiler.read(name)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "speedscope":
+        return collapsed_to_speedscope(name, collapsed)
+    return PlainTextResponse(collapsed)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(ProfilingMiddleware, profiler=profiler, admin_token=ADMIN_TOKEN)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -198,6 +878,36 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def seed_on_startup():
+    """Optionally seed and warm the in-memory catalog before taking traffic"""
+    global exposure_task, profiling_task
+    if SEED_ON_STARTUP:
+        # A failed seed must not keep the worker from serving; the next
+        # startup or /init-butterflies call retries it
+        try:
+            await seed_butterflies()
+        except SeedInProgress:
+            logger.warning("Another worker is still seeding; starting without waiting for it")
+        except Exception:
+            logger.exception("Seeding on startup failed")
+        try:
+            await ensure_catalog()
+        except Exception:
+            logger.exception("Warming the catalog on startup failed")
+    exposure_task = asyncio.create_task(exposure_sync_loop())
+    profiling_task = asyncio.create_task(profiling_sync_loop())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if profiling_task is not None:
+        profiling_task.cancel()
+    profiler.disable()
+    if exposure_task is not None:
+        exposure_task.cancel()
+        try:
+            await sync_exposure()
+        except Exception:
+            logger.exception("Final quiz exposure sync failed")
+    await asyncio.gather(*compaction_tasks, return_exceptions=True)
     client.close()
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   View,
   Text,
@@ -17,6 +17,7 @@ import axios from 'axios';
 
 const { width } = Dimensions.get('window');
 const EXPO_PUBLIC_BACKEND_URL = process.env.EXPO_PUBLIC_BACKEND_URL;
+const PAGE_SIZE = 20;
 
 interface Butterfly {
   id: string;
@@ -29,38 +30,61 @@ interface Butterfly {
 export default function AdminHomeScreen() {
   const router = useRouter();
   const [butterflies, setButterflies] = useState<Butterfly[]>([]);
-  const [filteredButterflies, setFilteredButterflies] = useState<Butterfly[]>([]);
+  const [total, setTotal] = useState(0);
+  const [totalExact, setTotalExact] = useState(true);
+  const [hasMore, setHasMore] = useState(false);
+  const [page, setPage] = useState(1);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [searchQuery, setSearchQuery] = useState('');
+  const requestIdRef = useRef(0);
 
   useEffect(() => {
-    loadButterflies();
-  }, []);
+    // Debounce typeahead so each keystroke doesn't hit the server
+    const timeout = setTimeout(() => {
+      loadButterflies(searchQuery, 1);
+    }, 200);
+    return () => clearTimeout(timeout);
+  }, [searchQuery]);
 
-  useEffect(() => {
-    if (searchQuery.trim() === '') {
-      setFilteredButterflies(butterflies);
-    } else {
-      const filtered = butterflies.filter(
-        (b) =>
-          b.commonName.toLowerCase().includes(searchQuery.toLowerCase()) ||
-          b.latinName.toLowerCase().includes(searchQuery.toLowerCase())
-      );
-      setFilteredButterflies(filtered);
-    }
-  }, [searchQuery, butterflies]);
-
-  const loadButterflies = async () => {
+  const loadButterflies = async (query: string, pageToLoad: number) => {
+    const requestId = ++requestIdRef.current;
     try {
-      setLoading(true);
-      const response = await axios.get(`${EXPO_PUBLIC_BACKEND_URL}/api/admin/butterflies`);
-      setButterflies(response.data);
-      setFilteredButterflies(response.data);
+      if (pageToLoad === 1) {
+        setLoading(butterflies.length === 0);
+      } else {
+        setLoadingMore(true);
+      }
+      const response = await axios.get(`${EXPO_PUBLIC_BACKEND_URL}/api/admin/butterflies/search`, {
+        params: { q: query.trim(), page: pageToLoad, limit: PAGE_SIZE },
+      });
+      // Ignore responses for queries the user has already typed past
+      if (requestId !== requestIdRef.current) return;
+      setButterflies((prev) =>
+        pageToLoad === 1 ? response.data.results : [...prev, ...response.data.results]
+      );
+      setTotal(response.data.total);
+      setTotalExact(response.data.totalExact);
+      // Broad queries only estimate the total, so a short page also ends the list
+      setHasMore(
+        response.data.results.length === PAGE_SIZE &&
+          (pageToLoad - 1) * PAGE_SIZE + response.data.results.length < response.data.total
+      );
+      setPage(pageToLoad);
     } catch (error) {
       console.error('Error loading butterflies:', error);
       Alert.alert('Error', 'Failed to load butterflies');
     } finally {
-      setLoading(false);
+      if (requestId === requestIdRef.current) {
+        setLoading(false);
+        setLoadingMore(false);
+      }
+    }
+  };
+
+  const handleLoadMore = () => {
+    if (!loadingMore && hasMore) {
+      loadButterflies(searchQuery, page + 1);
     }
   };
 
@@ -77,7 +101,7 @@ export default function AdminHomeScreen() {
             try {
               await axios.delete(`${EXPO_PUBLIC_BACKEND_URL}/api/admin/butterfly/${id}`);
               Alert.alert('Success', 'Butterfly deleted successfully');
-              loadButterflies();
+              loadButterflies(searchQuery, 1);
             } catch (error) {
               console.error('Error deleting butterfly:', error);
               Alert.alert('Error', 'Failed to delete butterfly');
@@ -163,12 +187,13 @@ export default function AdminHomeScreen() {
 
       {/* Butterfly Count */}
       <Text style={styles.countText}>
-        {filteredButterflies.length} {filteredButterflies.length === 1 ? 'butterfly' : 'butterflies'}
+        {totalExact ? '' : 'about '}
+        {total} {total === 1 ? 'butterfly' : 'butterflies'}
       </Text>
 
       {/* Butterfly List */}
       <ScrollView style={styles.listContainer} showsVerticalScrollIndicator={false}>
-        {filteredButterflies.map((butterfly) => (
+        {butterflies.map((butterfly) => (
           <View key={butterfly.id} style={styles.card}>
             <Image source={{ uri: butterfly.imageUrl }} style={styles.cardImage} contentFit="cover" />
             <View style={styles.cardContent}>
@@ -201,6 +226,15 @@ export default function AdminHomeScreen() {
             </View>
           </View>
         ))}
+        {hasMore && (
+          <TouchableOpacity style={styles.loadMoreButton} onPress={handleLoadMore}>
+            {loadingMore ? (
+              <ActivityIndicator color="#4CAF50" />
+            ) : (
+              <Text style={styles.loadMoreText}>Load more</Text>
+            )}
+          </TouchableOpacity>
+        )}
       </ScrollView>
     </SafeAreaView>
   );
@@ -340,6 +374,20 @@ const styles = StyleSheet.create({
     fontSize: 14,
     fontWeight: '600',
   },
+  loadMoreButton: {
+    backgroundColor: '#fff',
+    padding: 14,
+    borderRadius: 12,
+    alignItems: 'center',
+    marginBottom: 16,
+    borderWidth: 1,
+    borderColor: '#C8E6C9',
+  },
+  loadMoreText: {
+    color: '#4CAF50',
+    fontSize: 16,
+    fontWeight: '600',
+  },
   loadingText: {
     marginTop: 16,
     fontSize: 16,
@@ -26,6 +26,7 @@ interface Butterfly {
 interface QuizQuestion {
   correctAnswer: Butterfly;
   options: Butterfly[];
+  questionToken: string;
 }
 
 export default function GameScreen() {
@@ -41,6 +42,7 @@ export default function GameScreen() {
   const [timeLeft, setTimeLeft] = useState(10);
   const [isAnswered, setIsAnswered] = useState(false);
   const timerRef = useRef<NodeJS.Timeout | null>(null);
+  const sessionIdRef = useRef(`${Date.now()}-${Math.random().toString(36).slice(2)}`);
 
   useEffect(() => {
     loadQuestion();
@@ -71,7 +73,9 @@ export default function GameScreen() {
   const loadQuestion = async () => {
     try {
       setLoading(true);
-      const response = await axios.get(`${EXPO_PUBLIC_BACKEND_URL}/api/quiz/question`);
+      const response = await axios.get(`${EXPO_PUBLIC_BACKEND_URL}/api/quiz/question`, {
+        params: { sessionId: sessionIdRef.current },
+      });
       setQuestion(response.data);
       setShowOptions(false);
       setSelectedAnswer(null);
@@ -89,6 +93,16 @@ export default function GameScreen() {
     }
   };
 
+  const recordAnswer = (selectedId: string | null) => {
+    if (!question) return;
+    axios
+      .post(`${EXPO_PUBLIC_BACKEND_URL}/api/quiz/answer`, {
+        questionToken: question.questionToken,
+        selectedId,
+      })
+      .catch((error) => console.error('Error recording answer:', error));
+  };
+
   const handleTimeout = () => {
     if (timerRef.current) {
       clearInterval(timerRef.current);
@@ -96,6 +110,7 @@ export default function GameScreen() {
     setIsAnswered(true);
     setIsCorrect(false);
     setShowFeedback(true);
+    recordAnswer(null);
   };
 
   const handleAnswer = (butterfly: Butterfly) => {
@@ -109,6 +124,7 @@ export default function GameScreen() {
     setSelectedAnswer(butterfly.id);
     const correct = butterfly.id === question.correctAnswer.id;
     setIsCorrect(correct);
+    recordAnswer(butterfly.id);
     
     if (correct) {
       setScore(score + 1);
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The backend modules are run from backend/ (uvicorn server:app), so import them the same way
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
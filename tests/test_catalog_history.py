@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+
+from catalog_history import curated, plan_rollback, replay, snapshots_to_prune
+
+MONARCH = {"commonName": "Monarch", "latinName": "Danaus plexippus"}
+MORPHO = {"commonName": "Blue Morpho", "latinName": "Morpho menelaus"}
+NOW = datetime(2026, 3, 10, 12, 0, tzinfo=timezone.utc)
+
+
+def event(op, bid, after=None, before=None):
+    return {"op": op, "butterflyId": bid, "before": before, "after": after}
+
+
+EVENTS = [
+    event("seed", "a", MONARCH),
+    event("create", "b", MORPHO),
+    event("update", "a", {**MONARCH, "difficulty": 2}, MONARCH),
+    event("delete", "b", before=MORPHO),
+    event("restore", "b", MORPHO),
+    event("delete", "a", before={**MONARCH, "difficulty": 2, "fixtureHash": "h"}),
+]
+
+
+def test_replay_applies_events_in_order():
+    assert replay({}, EVENTS[:3]) == {"a": {**MONARCH, "difficulty": 2}, "b": MORPHO}
+    assert replay({}, EVENTS[:4]) == {"a": {**MONARCH, "difficulty": 2}}
+    assert replay({}, EVENTS) == {"b": MORPHO}
+
+
+def test_snapshot_plus_replay_matches_full_history():
+    for split in range(len(EVENTS) + 1):
+        snapshot = replay({}, EVENTS[:split])
+        assert replay(dict(snapshot), EVENTS[split:]) == replay({}, EVENTS)
+
+
+def test_replaying_events_a_snapshot_already_holds_is_harmless():
+    # The baseline snapshot is stamped in the past, so in-flight events may be replayed over it
+    live = replay({}, EVENTS)
+    for split in range(len(EVENTS) + 1):
+        assert replay(dict(live), EVENTS[split:]) == live
+
+
+def test_restore_uses_the_state_before_the_delete_as_curated():
+    last_delete = [e for e in EVENTS if e["op"] == "delete" and e["butterflyId"] == "a"][-1]
+    assert curated(last_delete["before"]) == {**MONARCH, "difficulty": 2}
+    # Restoring to a point in time reads the replayed state
+    assert replay({}, EVENTS[:3])["a"] == {**MONARCH, "difficulty": 2}
+
+
+def test_rollback_diff():
+    current = {
+        "a": {"_id": "a", **MONARCH, "difficulty": 3},
+        "b": {"_id": "b", **MORPHO},
+        "c": {"_id": "c", "commonName": "Painted Lady", "latinName": "Vanessa cardui"},
+    }
+    target = {"a": MONARCH, "b": MORPHO, "d": {"commonName": "Old", "latinName": "Vetus"}}
+    deletes, replaces = plan_rollback(current, target)
+    assert deletes == [current["c"]]
+    assert replaces == [("a", current["a"], MONARCH), ("d", None, target["d"])]
+    assert plan_rollback({"a": {"_id": "a", **MONARCH}}, {"a": MONARCH}) == ([], [])
+
+
+def test_rollback_deletes_recreated_species_before_restoring():
+    # Deleted and re-created under a new id with the same latinName
+    current = {"new": {"_id": "new", **MONARCH}}
+    deletes, replaces = plan_rollback(current, {"old": MONARCH})
+    assert deletes == [current["new"]]
+    assert replaces == [("old", None, MONARCH)]
+
+
+def snapshot(sid, age):
+    return {"_id": sid, "timestamp": (NOW - age).replace(tzinfo=None)}
+
+
+def test_snapshot_retention():
+    snapshots = [snapshot("baseline", timedelta(days=400))]
+    snapshots += [snapshot(f"d{d}h{h}", timedelta(days=d, hours=h)) for d in range(40) for h in (0, 3)]
+    doomed = set(snapshots_to_prune(snapshots, NOW, keep_latest=3, keep_days=30))
+    kept = {s["_id"] for s in snapshots} - doomed
+    # Newest three, the newest of each day back to the horizon, and the oldest
+    assert kept == {"d0h0", "d0h3", "d1h0", "baseline"} | {f"d{d}h0" for d in range(31)}
+    assert "d35h0" in doomed and "d5h3" in doomed
+    assert snapshots_to_prune([], NOW, 3, 30) == []
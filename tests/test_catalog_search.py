@@ -0,0 +1,194 @@
+import random
+import time
+
+import pytest
+
+from catalog_search import TOKEN_RE, CatalogSearchIndex, normalize_name, trigrams
+
+SPECIES = [
+    {"_id": "1", "commonName": "Monarch", "latinName": "Danaus plexippus"},
+    {"_id": "2", "commonName": "Blue Morpho", "latinName": "Morpho menelaus"},
+    {"_id": "3", "commonName": "Painted Lady", "latinName": "Vanessa cardui"},
+    {"_id": "4", "commonName": "American Lady", "latinName": "Vanessa virginiensis"},
+    {"_id": "5", "commonName": "Common Checkered-Skipper", "latinName": "Pyrgus communis"},
+    {"_id": "6", "commonName": "Monarchy Blue", "latinName": "Fictus regalis"},
+]
+
+
+def make_index(docs=SPECIES):
+    index = CatalogSearchIndex()
+    index.load(docs)
+    return index
+
+
+def names(results):
+    return [doc["commonName"] for doc in results]
+
+
+def assert_index_matches(index, docs):
+    """Incremental updates must leave the same structures as a fresh load"""
+    fresh = make_index(docs)
+    assert index._full == fresh._full
+    assert index._tokens == fresh._tokens
+    assert index._ordered == fresh._ordered
+    assert index._trigrams == fresh._trigrams
+    assert index._names == fresh._names
+    assert index._short == fresh._short
+    assert index._ranked == fresh._ranked
+    assert index._haystack == fresh._haystack
+    assert index._word_starts == fresh._word_starts
+    assert set(index.docs) == set(fresh.docs)
+
+
+def test_ranking_tiers():
+    index = make_index()
+    # Exact name, then name prefix, then word prefix
+    assert names(index.search("monarch")[1]) == ["Monarch", "Monarchy Blue"]
+    total, results, _ = index.search("morpho")
+    assert total == 1
+    assert names(results) == ["Blue Morpho"]
+    # Word prefix ranks ahead of a bare substring match
+    total, results, _ = index.search("lady")
+    assert names(results) == ["Painted Lady", "American Lady"]
+    assert names(index.search("arch")[1]) == ["Monarch", "Monarchy Blue"]
+
+
+def test_word_prefixes_across_both_names():
+    index = make_index()
+    assert names(index.search("vanessa virg")[1]) == ["American Lady"]
+    assert names(index.search("skip")[1]) == ["Common Checkered-Skipper"]
+
+
+def test_short_queries_match_substrings():
+    index = make_index()
+    # The old on-device filter matched any substring, whatever its length
+    assert "Blue Morpho" in names(index.search("or", limit=10)[1])
+    assert index.search("zz")[0] == 0
+
+
+def test_empty_query_lists_everything_alphabetically():
+    total, results, _ = make_index().search("", limit=3)
+    assert total == len(SPECIES)
+    assert names(results) == ["American Lady", "Blue Morpho", "Common Checkered-Skipper"]
+
+
+def test_pagination():
+    index = make_index()
+    total, first, _ = index.search("", offset=0, limit=4)
+    _, second, _ = index.search("", offset=4, limit=4)
+    assert total == len(SPECIES)
+    assert len(first) == 4
+    assert len(second) == 2
+    assert not set(names(first)) & set(names(second))
+    assert index.search("lady", offset=1, limit=1)[1] == [SPECIES[3]]
+
+
+def test_upsert_and_remove_keep_structures_consistent():
+    index = make_index()
+    added = {"_id": "7", "commonName": "Gulf Fritillary", "latinName": "Agraulis vanillae"}
+    renamed = {"_id": "1", "commonName": "Monarch Butterfly", "latinName": "Danaus plexippus"}
+    index.upsert(added)
+    index.upsert(renamed)
+    index.remove("2")
+    index.remove("missing")
+    expected = [renamed] + [d for d in SPECIES if d["_id"] not in ("1", "2")] + [added]
+    assert_index_matches(index, expected)
+    assert names(index.search("fritill")[1]) == ["Gulf Fritillary"]
+    assert index.search("morpho")[0] == 0
+    assert names(index.search("monarch")[1]) == ["Monarchy Blue", "Monarch Butterfly"]
+    # Lists stay sorted so bisect lookups remain valid
+    for entries in (index._full, index._tokens, index._ordered, index._ranked):
+        assert entries == sorted(entries)
+    for buckets in index._short.values():
+        assert all(bucket == sorted(bucket) for bucket in buckets)
+
+
+def test_removed_trigram_postings_are_dropped():
+    index = make_index()
+    index.remove("5")
+    for gram in trigrams("pyrgus communis"):
+        assert "5" not in index._trigrams.get(gram, set())
+    assert "gus" not in index._trigrams
+
+
+def reference_ranking(docs, query):
+    """Brute-force tiers for a one- or two-character query"""
+    ranked = []
+    for doc in docs:
+        common, latin = normalize_name(doc["commonName"]), normalize_name(doc["latinName"])
+        if query not in common and query not in latin:
+            continue
+        words = TOKEN_RE.findall(common) + TOKEN_RE.findall(latin)
+        if query in (common, latin):
+            tier = 0
+        elif common.startswith(query) or latin.startswith(query):
+            tier = 1
+        elif any(word.startswith(query) for word in words):
+            tier = 2
+        else:
+            tier = 3
+        ranked.append((tier, len(common), common, doc["_id"]))
+    return [key[3] for key in sorted(ranked)]
+
+
+def test_short_queries_use_ranked_buckets():
+    index = make_index()
+    queries = {"a", "m", "mo", "or", "d-", "-s", "zz"}
+    for doc in SPECIES:
+        queries |= {doc["latinName"].lower()[:2], doc["commonName"].lower()[-2:]}
+    for query in queries:
+        expected = reference_ranking(SPECIES, query)
+        total, results, exact = index.search(query, limit=100)
+        assert exact
+        assert total == len(expected)
+        assert [doc["_id"] for doc in results] == expected
+        # Pages are slices of the same ranking
+        assert [doc["_id"] for doc in index.search(query, offset=1, limit=2)[1]] == expected[1:3]
+
+
+def test_broad_substring_totals_are_estimated(monkeypatch):
+    monkeypatch.setattr("catalog_search.VERIFY_LIMIT", 0)
+    index = make_index()
+    # Has every trigram of "onarch" but not the substring itself
+    index.upsert({"_id": "7", "commonName": "Tonal Birch", "latinName": "Narcissus arcus"})
+    total, results, exact = index.search("onarch")
+    assert not exact
+    assert total == 3
+    # Unverified candidates are still checked before they are ranked
+    assert names(results) == ["Monarch", "Monarchy Blue"]
+
+
+def random_catalog(n, seed=7):
+    rng = random.Random(seed)
+    syllables = [c + v for c in "bcdfghklmnprstvwz" for v in "aeiou"] + ["ch", "th", "ll", "ss", "x"]
+
+    def word():
+        return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+
+    return [
+        {"_id": str(i), "commonName": f"{word().capitalize()} {word()}", "latinName": f"{word().capitalize()} {word()}"}
+        for i in range(n)
+    ]
+
+
+@pytest.fixture(scope="module")
+def large_index():
+    docs = random_catalog(100_000)
+    index = CatalogSearchIndex()
+    index.load(docs)
+    return docs, index
+
+
+def test_typeahead_stays_under_10ms_at_100k_species(large_index):
+    docs, index = large_index
+    queries = ["a", "m", "mo", "e", "ba", "ka b"]
+    for doc in docs[:20]:
+        name = doc["commonName"].lower()
+        queries += [name[:n] for n in range(1, len(name) + 1)]
+    for query in queries:
+        best = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            index.search(query)
+            best = min(best, time.perf_counter() - start)
+        assert best < 0.010, f"{query!r} took {best * 1000:.1f}ms"
@@ -0,0 +1,90 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from profiling import Profiler, ProfilingMiddleware, collapsed_to_speedscope
+
+COLLAPSED = (
+    "thread MainThread;main (app.py:1);handler (app.py:10) 3\n"
+    "thread MainThread;main (app.py:1);query (db.py:5) 2\n"
+)
+
+
+def test_collapsed_to_speedscope_shares_frames():
+    profile = collapsed_to_speedscope("demo", COLLAPSED)
+    frames = profile["shared"]["frames"]
+    assert frames == [
+        {"name": "thread MainThread"},
+        {"name": "main", "file": "app.py", "line": 1},
+        {"name": "handler", "file": "app.py", "line": 10},
+        {"name": "query", "file": "db.py", "line": 5},
+    ]
+    sampled = profile["profiles"][0]
+    assert sampled["samples"] == [[0, 1, 2], [0, 1, 3]]
+    assert sampled["weights"] == [3, 2]
+    assert sampled["endValue"] == 5
+
+
+def test_profile_ring_keeps_newest(tmp_path):
+    profiler = Profiler(tmp_path, ring_size=3)
+    for i in range(5):
+        profiler._write(Counter({f"thread t;f{i} (x.py:1)": 1}), f"GET /api/{i}")
+    listed = profiler.list()
+    assert len(listed) == 3
+    assert [p["name"] for p in listed] == sorted((p.name for p in tmp_path.iterdir()), reverse=True)
+    assert "f4" in profiler.read(listed[0]["name"])
+    assert all(p["name"].endswith("GET_api_%d.collapsed" % i) for p, i in zip(listed, (4, 3, 2)))
+
+
+@pytest.mark.parametrize("name", ["../secret.collapsed", "nested/x.collapsed", "profile.txt", "missing.collapsed"])
+def test_read_rejects_unknown_names(tmp_path, name):
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "nested" / "x.collapsed").write_text("x 1\n")
+    (tmp_path / "profile.txt").write_text("x 1\n")
+    profiler = Profiler(tmp_path / "profiles")
+    (tmp_path / "profiles").mkdir()
+    with pytest.raises(FileNotFoundError):
+        profiler.read(name)
+
+
+class FailingProfiler(Profiler):
+    def begin(self):
+        raise AssertionError("disabled profiling must not start a capture")
+
+    def should_sample(self, path):
+        raise AssertionError("disabled profiling must not draw a sample")
+
+
+async def call(middleware, headers=()):
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(scope["path"])
+
+    middleware.app = app
+    await middleware({"type": "http", "method": "GET", "path": "/api/quiz", "headers": list(headers)}, None, None)
+    return calls
+
+
+def test_middleware_disabled_path_skips_profiler(tmp_path):
+    middleware = ProfilingMiddleware(None, FailingProfiler(tmp_path))
+    assert asyncio.run(call(middleware, [(b"x-profile", b"1")])) == ["/api/quiz"]
+
+
+class CountingProfiler(Profiler):
+    begun = 0
+
+    def begin(self):
+        self.begun += 1
+        return super().begin()
+
+
+def test_middleware_forced_capture_requires_admin_token(tmp_path):
+    profiler = CountingProfiler(tmp_path, interval=0.001)
+    middleware = ProfilingMiddleware(None, profiler, admin_token="secret")
+    asyncio.run(call(middleware, [(b"x-profile", b"1"), (b"x-admin-token", b"wrong")]))
+    assert profiler.begun == 0
+    assert asyncio.run(call(middleware, [(b"x-profile", b"1"), (b"x-admin-token", b"secret")])) == ["/api/quiz"]
+    assert profiler.begun == 1
+    assert not profiler.capturing
@@ -0,0 +1,191 @@
+import random
+from collections import Counter
+
+import pytest
+
+from quiz_sampling import FenwickSampler, QuizSampler, species_weight
+
+
+def assert_tree_consistent(sampler):
+    assert sampler.total() == pytest.approx(sum(sampler._weights))
+    for i in range(len(sampler._weights) + 1):
+        assert sampler._prefix(i) == pytest.approx(sum(sampler._weights[:i]))
+
+
+def test_append_keeps_prefix_sums():
+    sampler = FenwickSampler()
+    for i in range(37):
+        sampler.set_weight(str(i), i % 5 + 1)
+        assert_tree_consistent(sampler)
+    assert len(sampler) == 37
+
+
+def test_set_weight_updates_existing_entry():
+    sampler = FenwickSampler()
+    for i in range(10):
+        sampler.set_weight(str(i), 1.0)
+    sampler.set_weight("3", 7.5)
+    assert sampler.weight("3") == 7.5
+    assert len(sampler) == 10
+    assert_tree_consistent(sampler)
+
+
+def test_remove_and_rebuild():
+    sampler = FenwickSampler()
+    for i in range(60):
+        sampler.set_weight(str(i), 1.0)
+    for i in range(50):
+        sampler.remove(str(i))
+        assert_tree_consistent(sampler)
+    # Free slots dominated, so the tree was compacted
+    assert len(sampler._weights) < 60
+    assert len(sampler) == 10
+    assert "0" not in sampler
+    rng = random.Random(0)
+    assert {sampler.sample(rng) for _ in range(500)} == {str(i) for i in range(50, 60)}
+
+
+def test_sample_is_proportional_to_weight():
+    sampler = FenwickSampler()
+    for bid, weight in (("a", 1.0), ("b", 3.0), ("c", 6.0)):
+        sampler.set_weight(bid, weight)
+    rng = random.Random(1)
+    counts = Counter(sampler.sample(rng) for _ in range(20000))
+    assert counts["a"] / 20000 == pytest.approx(0.1, abs=0.02)
+    assert counts["b"] / 20000 == pytest.approx(0.3, abs=0.02)
+    assert counts["c"] / 20000 == pytest.approx(0.6, abs=0.02)
+
+
+def test_sample_distinct_leaves_weights_untouched():
+    sampler = FenwickSampler()
+    for i in range(8):
+        sampler.set_weight(str(i), float(i + 1))
+    before = list(sampler._weights)
+    rng = random.Random(2)
+    for _ in range(50):
+        drawn = sampler.sample_distinct(5, rng, exclude={"7"})
+        assert len(drawn) == 5
+        assert len(set(drawn)) == 5
+        assert "7" not in drawn
+    assert sampler._weights == before
+    assert_tree_consistent(sampler)
+
+
+def test_sample_excluding_most_mass_falls_back():
+    sampler = FenwickSampler()
+    sampler.set_weight("heavy", 1e9)
+    sampler.set_weight("light", 1.0)
+    assert sampler.sample(random.Random(3), exclude={"heavy"}) == "light"
+    assert sampler.sample(random.Random(3), exclude={"heavy", "light"}) is None
+
+
+def make_quiz(n=10):
+    quiz = QuizSampler()
+    quiz.load([{"_id": str(i), "commonName": f"Species {i}"} for i in range(n)])
+    return quiz
+
+
+def test_draw_returns_distinct_options():
+    quiz = make_quiz()
+    rng = random.Random(4)
+    for _ in range(100):
+        correct, wrong = quiz.draw("s1", rng=rng)
+        assert len(wrong) == 4
+        assert len({correct, *wrong}) == 5
+
+
+def test_global_weights_follow_history():
+    quiz = make_quiz()
+    quiz.record_shown("1")
+    quiz.record_shown("1")
+    quiz.record_missed("2")
+    assert quiz.sampler.weight("1") == pytest.approx(species_weight(2, 0))
+    assert quiz.sampler.weight("2") == pytest.approx(species_weight(0, 1))
+
+
+def test_session_history_counts_once():
+    quiz = make_quiz()
+    quiz.record_shown("1", "s1")
+    # Global history includes the session's show exactly once...
+    assert quiz.stats["1"] == {"shown": 1, "missed": 0}
+    assert quiz.sampler.weight("1") == pytest.approx(species_weight(1, 0))
+    # ...and the session applies its own counts once on top of that
+    assert quiz.session_weight("1", "s1") == pytest.approx(
+        species_weight(1, 0) * species_weight(1, 0)
+    )
+    # Other sessions only see the global weight
+    assert quiz.session_weight("1", "s2") == pytest.approx(species_weight(1, 0))
+
+
+def test_session_tracks_global_changes_for_untouched_species():
+    quiz = make_quiz()
+    quiz.record_shown("1", "s1")
+    quiz.record_missed("5", "other")
+    assert quiz.session_weight("5", "s1") == pytest.approx(species_weight(0, 1))
+    # Sessions store only sparse counts, not sampler copies
+    assert quiz.sessions["s1"] == {"1": {"shown": 1, "missed": 0}}
+
+
+def test_session_draws_favour_missed_species():
+    quiz = make_quiz()
+    for _ in range(5):
+        quiz.record_missed("3", "s1")
+    rng = random.Random(5)
+    counts = Counter(quiz.draw("s1", rng=rng)[0] for _ in range(5000))
+    expected = quiz.session_weight("3", "s1") / sum(
+        quiz.session_weight(str(i), "s1") for i in range(10)
+    )
+    assert counts["3"] / 5000 == pytest.approx(expected, abs=0.03)
+
+
+def test_remove_drops_species_from_sessions():
+    quiz = make_quiz()
+    quiz.record_shown("1", "s1")
+    quiz.remove("1")
+    assert "1" not in quiz.sessions["s1"]
+    rng = random.Random(6)
+    for _ in range(50):
+        correct, wrong = quiz.draw("s1", rng=rng)
+        assert "1" not in {correct, *wrong}
+
+
+def test_session_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr("quiz_sampling.MAX_SESSIONS", 3)
+    quiz = make_quiz()
+    for i in range(5):
+        quiz.record_shown("1", f"s{i}")
+    assert list(quiz.sessions) == ["s2", "s3", "s4"]
+
+
+def test_new_species_start_at_median_exposure():
+    quiz = make_quiz(3)
+    for bid, shown in (("0", 100), ("1", 200), ("2", 300)):
+        for _ in range(shown):
+            quiz.record_shown(bid)
+    quiz.upsert({"_id": "new", "commonName": "New"})
+    assert quiz.stats["new"] == {"shown": 200, "missed": 0}
+    assert quiz.sampler.weight("new") == pytest.approx(quiz.sampler.weight("1"))
+
+
+def test_pending_counts_survive_a_sync():
+    quiz = make_quiz(3)
+    quiz.record_shown("0")
+    pending, baselines = quiz.take_pending()
+    assert pending == {"0": {"shown": 1, "missed": 0}}
+    assert set(baselines) == {"0", "1", "2"}
+    # Recorded after the flush, before the shared totals come back
+    quiz.record_missed("0")
+    quiz.apply_totals({"0": {"shown": 7, "missed": 2}, "gone": {"shown": 1, "missed": 0}})
+    assert quiz.stats["0"] == {"shown": 7, "missed": 3}
+    assert quiz.sampler.weight("0") == pytest.approx(species_weight(7, 3))
+    assert "gone" not in quiz.stats
+
+
+def test_failed_flush_is_restored():
+    quiz = make_quiz(2)
+    quiz.record_shown("0")
+    pending, baselines = quiz.take_pending()
+    quiz.record_shown("0")
+    quiz.restore_pending(pending, baselines)
+    assert quiz.pending["0"]["shown"] == 2
+    assert set(quiz.baselines) == {"0", "1"}
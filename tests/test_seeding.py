@@ -0,0 +1,75 @@
+import itertools
+import json
+from pathlib import Path
+
+from seeding import fixture_hash, fixtures_current, load_fixtures, plan_seed
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "backend" / "fixtures" / "butterflies"
+
+MONARCH = {"commonName": "Monarch", "latinName": "Danaus plexippus", "imageUrl": "m.jpg", "difficulty": 1}
+MORPHO = {"commonName": "Blue Morpho", "latinName": "Morpho menelaus", "imageUrl": "b.jpg", "difficulty": 2}
+
+
+def write_fixture(directory, name, records):
+    (directory / name).write_text(json.dumps(records))
+
+
+def plan(batch, existing=(), deleted=()):
+    ids = itertools.count(100)
+    return plan_seed(batch, {b["latinName"]: b for b in existing}, set(deleted), lambda: next(ids))
+
+
+def test_bundled_fixtures_load():
+    checksum, records = load_fixtures(FIXTURES_DIR)
+    assert len(records) == 30
+    assert len({r["latinName"] for r in records}) == 30
+    assert checksum == load_fixtures(FIXTURES_DIR)[0]
+
+
+def test_later_fixture_files_override_by_latin_name(tmp_path):
+    write_fixture(tmp_path, "0001_initial.json", [MONARCH, MORPHO])
+    write_fixture(tmp_path, "0002_fix.json", [{**MONARCH, "difficulty": 3}])
+    _, records = load_fixtures(tmp_path)
+    assert records == [{**MONARCH, "difficulty": 3}, MORPHO]
+
+
+def test_checksum_skip(tmp_path):
+    write_fixture(tmp_path, "0001_initial.json", [MONARCH])
+    checksum, _ = load_fixtures(tmp_path)
+    state = {"_id": "butterflies", "checksum": checksum}
+    assert fixtures_current(state, checksum)
+    assert not fixtures_current(state, checksum, force=True)
+    assert not fixtures_current(None, checksum)
+    # Any change to the fixture files changes the checksum
+    write_fixture(tmp_path, "0002_more.json", [MORPHO])
+    assert not fixtures_current(state, load_fixtures(tmp_path)[0])
+
+
+def test_new_species_are_inserted_with_their_hash():
+    inserts, updates = plan([MONARCH, MORPHO])
+    assert updates == []
+    assert inserts == [
+        {**MONARCH, "fixtureHash": fixture_hash(MONARCH), "_id": 100},
+        {**MORPHO, "fixtureHash": fixture_hash(MORPHO), "_id": 101},
+    ]
+
+
+def test_deleted_species_are_not_reinserted():
+    inserts, _ = plan([MONARCH, MORPHO], deleted=[MONARCH["latinName"]])
+    assert [doc["latinName"] for doc in inserts] == [MORPHO["latinName"]]
+
+
+def test_seeded_species_follow_fixture_changes():
+    stored = {**MONARCH, "_id": 1, "fixtureHash": fixture_hash(MONARCH)}
+    assert plan([MONARCH], existing=[stored]) == ([], [])
+    changed = {**MONARCH, "difficulty": 2}
+    inserts, updates = plan([changed], existing=[stored])
+    assert inserts == []
+    assert updates == [(stored, {**changed, "fixtureHash": fixture_hash(changed)})]
+
+
+def test_curated_species_are_never_overwritten():
+    # Admin edits drop fixtureHash; admin-created species never had one
+    edited = {**MONARCH, "_id": 1, "commonName": "Monarch (curated)"}
+    created = {**MORPHO, "_id": 2}
+    assert plan([{**MONARCH, "difficulty": 3}, MORPHO], existing=[edited, created]) == ([], [])